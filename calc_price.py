@@ -10,6 +10,15 @@ price, adding sales tax, and rounding to the nearest dollar.
 Retail prices are calculated by removing sales tax, inverting the
 discount, rounding to the nearest dime, and subtracting a penny.
 
+The calc_*_prices() functions convert a whole column of prices in one
+call.  The discount and tax factors are computed once, and each
+distinct price is converted only once, so repricing an entire catalog
+(which has few distinct prices) takes milliseconds.  By default they
+return the same floats as the single price functions.  With
+exact=True, the arithmetic is done with Decimals, which avoids binary
+floating point error (e.g., a price that is exactly $x.50 after tax is
+always rounded up), and the results are Decimals.
+
 To generate a table of event to retail prices::
 
   echo "event,retail";\
@@ -21,9 +30,16 @@ To generate a table of event to retail prices::
 
 from __future__ import print_function
 import argparse
+import decimal
 import math
-import Tkinter
-import tkMessageBox
+
+# Tk is only needed by the gui command, so the price calculations can
+# be used on a server without it.
+try:
+    import Tkinter  # sudo apt-get install python-tk
+    import tkMessageBox
+except ImportError:
+    Tkinter = None
 
 
 def calc_event_price(retail_price, discount_percent, sales_tax_percent):
@@ -72,6 +88,126 @@ def calc_wholesale_price(retail_price, wholesale_fraction):
     return price * wholesale_fraction
 
 
+def to_decimal(value):
+    """
+    Convert a price, percentage, or fraction to a Decimal.  Floats are
+    converted via their shortest repr, so 8.3 becomes Decimal("8.3")
+    rather than its binary approximation.
+    """
+    if isinstance(value, decimal.Decimal):
+        return value
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    return decimal.Decimal(str(value).strip())
+
+
+def _round_half_up(value):
+    """Round a Decimal to an integer like math.floor(value + 0.5)."""
+    return (value + decimal.Decimal("0.5")).to_integral_value(
+        rounding=decimal.ROUND_FLOOR
+    )
+
+
+def _map_distinct(function, prices):
+    """
+    Return a list of function(price) for each price, calling function
+    only once for each distinct price.
+    """
+    results = dict()
+    column = list()
+    for price in prices:
+        try:
+            result = results[price]
+        except KeyError:
+            result = results[price] = function(price)
+        column.append(result)
+    return column
+
+
+def calc_event_prices(
+    retail_prices,
+    discount_percent,
+    sales_tax_percent,
+    exact=False
+):
+    """Calculate the event prices of a sequence of retail prices."""
+    if exact:
+        one = decimal.Decimal(1)
+        discount_factor = one - to_decimal(discount_percent) / 100
+        tax_factor = one + to_decimal(sales_tax_percent) / 100
+
+        def calc(retail_price):
+            """Calculate one event price."""
+            price = to_decimal(retail_price) * discount_factor
+            price = price * tax_factor
+            return max(one, _round_half_up(price))
+    else:
+        # Same operations in the same order as calc_event_price().
+        discount_factor = 1.0 - float(discount_percent) / 100.0
+        tax_factor = 1.0 + float(sales_tax_percent) / 100.0
+
+        def calc(retail_price):
+            """Calculate one event price."""
+            price = float(retail_price) * discount_factor
+            price = price * tax_factor
+            return max(1.0, math.floor(price + 0.5))
+
+    return _map_distinct(calc, retail_prices)
+
+
+def calc_retail_prices(
+    event_prices,
+    discount_percent,
+    sales_tax_percent,
+    exact=False
+):
+    """Calculate the retail prices of a sequence of event prices."""
+    if exact:
+        one = decimal.Decimal(1)
+        tax_factor = one + to_decimal(sales_tax_percent) / 100
+        discount_factor = one - to_decimal(discount_percent) / 100
+        ten = decimal.Decimal(10)
+        penny = decimal.Decimal("0.01")
+
+        def calc(event_price):
+            """Calculate one retail price."""
+            price = to_decimal(event_price) / tax_factor
+            price = price / discount_factor
+            return max(penny, _round_half_up(price * ten) / ten - penny)
+    else:
+        # Same operations in the same order as calc_retail_price().
+        tax_factor = 1.0 + float(sales_tax_percent) / 100.0
+        discount_factor = 1.0 - float(discount_percent) / 100.0
+
+        def calc(event_price):
+            """Calculate one retail price."""
+            price = float(event_price) / tax_factor
+            price = price / discount_factor
+            return max(0.01, math.floor(price * 10.0 + 0.5) / 10.0 - 0.01)
+
+    return _map_distinct(calc, event_prices)
+
+
+def calc_wholesale_prices(retail_prices, wholesale_fraction, exact=False):
+    """Calculate the wholesale prices of a sequence of retail prices."""
+    if exact:
+        one = decimal.Decimal(1)
+        fraction = to_decimal(wholesale_fraction)
+
+        def calc(retail_price):
+            """Calculate one wholesale price."""
+            price = to_decimal(retail_price)
+            if price > one:
+                price = _round_half_up(price)
+            return price * fraction
+    else:
+        def calc(retail_price):
+            """Calculate one wholesale price."""
+            return calc_wholesale_price(retail_price, wholesale_fraction)
+
+    return _map_distinct(calc, retail_prices)
+
+
 class AppGUI(object):
     """Application graphical user interface."""
 
@@ -335,6 +471,8 @@ def main():
         )
         print("{:,.2f}".format(price))
     else:
+        if Tkinter is None:
+            arg_parser.error("gui requires Tkinter (python-tk)")
         root = Tkinter.Tk()
         root.title("Calc Product Price")
         AppGUI(args, root)
@@ -17,7 +17,7 @@ YAML format.  The schema is:
         RULE1_ID:
             disabled: message why rule disabled (key optional)
             itemtype: category|product|variant
-            test: Python predicate, True means test passed
+            test: Python predicate expression, True means test passed
             message: message output if test returned False
         RULE2_ID:
             ...
@@ -26,6 +26,29 @@ YAML format.  The schema is:
 The message is formatted using message.format(current_item), so it can
 contain member variable references like "{SKU}".
 
+A test can refer to the current item as "item", to the list of all items
+of the same itemtype as "items", and to these helpers, whose indexes are
+built once per item list:
+
+    group(KEY1, KEY2, ...)
+        list of the items whose KEY values equal those of the current
+        item, including the current item
+    count_where((KEY1, KEY2, ...), {KEY: VALUE, ...})
+        number of items in group(KEY1, KEY2, ...) whose KEY values equal
+        all of the VALUEs
+
+Variants also have a "_question_id" key (the question part of "Question
+ID|Answer ID") and an "_is_first_answer" key.
+
+The findings of tests that only refer to the current item are cached
+(in ~/.cache/cctools/cclint-findings.pickle) by a hash of the item and
+of the rules, so only new or changed items are checked again.  Tests
+that refer to items, group, or count_where are always evaluated.
+--profile does not use the cache, so that every test is timed.
+
+The tests are compiled when the rules file is loaded, so a test with a
+syntax error is reported before any item is checked.
+
 For YAML syntax, see:
 * http://wikipedia.org/wiki/YAML
 * http://pyyaml.org/wiki/PyYAMLDocumentation
@@ -33,19 +56,31 @@ For YAML syntax, see:
 
 from __future__ import print_function
 import ConfigParser
-import Tkinter
+import Queue
 import argparse
+import cPickle as pickle
 import cctools
+import hashlib
+import json
 import logging
+import multiprocessing
 import os
 import re
 import sys
-import tkFont
-import tkMessageBox
-import ttk
+import threading
+import timeit
 import webbrowser
 import yaml  # sudo pip install pyyaml
 
+# Tk is only needed by --gui, so cclint can run on a server without it.
+try:
+    import Tkinter  # sudo apt-get install python-tk
+    import tkFont
+    import tkMessageBox
+    import ttk
+except ImportError:
+    Tkinter = None
+
 
 # def dupe_checking_hook(pairs):
 #     """
@@ -73,6 +108,42 @@ def load_constants(constants, eval_locals):
         exec(statement, {}, eval_locals)
 
 
+# Names in a rule test that refer to items other than the current item.
+CROSS_ITEM_NAMES = frozenset(["items", "group", "count_where"])
+
+# Number of items checked between progress notifications.
+PROGRESS_INTERVAL = 100
+
+# Milliseconds between polls of the GUI queue.
+QUEUE_POLL_MS = 100
+
+# Seconds between checks for cancellation while exports download.
+DOWNLOAD_POLL_SECONDS = 1.0
+
+
+def code_names(code):
+    """Return the set of names used by a code object and nested code."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, "co_names"):
+            names |= code_names(const)
+    return names
+
+
+def item_hash(item):
+    """
+    Return a digest of the keys and values of an item.  It is the same
+    in every run, and it works for values that are not hashable, such
+    as the list of extra columns of a row with too many fields.
+    """
+    return hashlib.md5(repr(sorted(item.items()))).hexdigest()
+
+
+def category_display_name(category):
+    """Construct a display name for a category."""
+    return category["Category Name"]
+
+
 def product_display_name(product):
     """Construct a display name for a product."""
     display_name = "{} {}".format(product["SKU"], product["Product Name"])
@@ -93,13 +164,14 @@ def add_is_first_answer_flag(variants):
     """
     Set _is_first_answer to True for the first answer seen for a
     product: question.  This allows us to make checks per
-    product: question.
+    product: question.  Also set _question_id.
     """
     prev_product_id = None
     prev_question_id = None
     for variant in variants:
         product_id = variant['Product Id']
         question_id = variant['Question ID|Answer ID'].split("|")[0]
+        variant['_question_id'] = question_id
         variant['_is_first_answer'] = (
             product_id != prev_product_id or
             question_id != prev_question_id
@@ -108,6 +180,54 @@ def add_is_first_answer_flag(variants):
             prev_product_id = product_id
             prev_question_id = question_id
 
+
+class ItemIndex(object):
+    """
+    Group indexes over a list of items that rule tests use to find the
+    siblings of the current item without scanning the list.  Each index
+    is built with a single pass over the list the first time that it
+    is used.
+    """
+    def __init__(self, items, eval_locals):
+        self._items = items
+        self._eval_locals = eval_locals
+        self._groups = {}
+        self._counts = {}
+
+    def _current_values(self, keys):
+        """Return the values of keys in the current item."""
+        item = self._eval_locals["item"]
+        return tuple(item[key] for key in keys)
+
+    def group(self, *keys):
+        """
+        Return the items whose keys have the same values as the
+        current item, including the current item.
+        """
+        if keys not in self._groups:
+            self._groups[keys] = cctools.group_by(self._items, *keys)
+        return self._groups[keys].get(self._current_values(keys), [])
+
+    def count_where(self, keys, where=None):
+        """
+        Return the number of items in group(*keys) whose values equal
+        all of the values in the where dictionary.
+        """
+        if isinstance(keys, basestring):
+            keys = (keys,)
+        keys = tuple(keys)
+        where = tuple(sorted((where or {}).items()))
+        index_key = (keys, where)
+        if index_key not in self._counts:
+            counts = {}
+            for item in self._items:
+                if all(item[key] == value for key, value in where):
+                    values = tuple(item[key] for key in keys)
+                    counts[values] = counts.get(values, 0) + 1
+            self._counts[index_key] = counts
+        return self._counts[index_key].get(self._current_values(keys), 0)
+
+
 def item_edit_url(config, itemtype, item):
     """Create an URL for editing an item."""
     base_url = config.get("website", "base_url") + "/admin/index.php"
@@ -178,13 +298,61 @@ def finding_to_string(finding):
     return "{0} '{1}'\n    {2}: {3}\n    {4}".format(*finding)
 
 
+# The application whose current item list is checked by pool workers.
+# Forked workers inherit it.
+_POOL_APP = None
+
+
+def check_items_chunk(chunk):
+    """
+    Check items[start:stop] of the current item list in a pool worker.
+    Return the findings, the findings cache entries that were used, and
+    the rule statistics (if profiling).
+    """
+    itemtype, start, stop, display_name = chunk
+    app = _POOL_APP
+    app.used_cache_keys = set()
+    if app.rule_stats is not None:
+        app.rule_stats = {}
+    findings = []
+    for item in app.eval_locals["items"][start:stop]:
+        findings.extend(app.check_item(itemtype, item, display_name(item)))
+    cache_entries = {}
+    if app.findings_cache is not None:
+        cache_entries = dict(
+            (key, app.findings_cache[key]) for key in app.used_cache_keys
+        )
+    return findings, cache_entries, app.rule_stats
+
+
 class AppUI(object):
     """Base application user interface."""
     def __init__(self, args):
         self.args = args
         self.config = None
+        self.eval_globals = {"__builtins__": {"len": len, "re": re}}
         self.eval_locals = {}
         self.rules = {}
+        # Map of itemtype to a list of (rule_id, rule) tuples.
+        self.rules_by_itemtype = {}
+        # Map of itemtype to a hash of everything that its rules
+        # depend upon besides the item.  Itemtypes that only have cross
+        # item rules are not included.
+        self.rules_hashes = {}
+        self.constants = {}
+        # Map of (itemtype, item_name, item_hash, rules_hash) to a dict
+        # of rule_id to the findings of the single item rules, or None
+        # if findings are not cached.
+        self.findings_cache = None
+        self.used_cache_keys = set()
+        # Map of rule_id to [evaluations, total seconds, failures], or
+        # None if not profiling.
+        self.rule_stats = {} if args.profile else None
+        self.findings_cache_filename = os.path.join(
+            cctools.xdg_cache_home,
+            "cctools",
+            "cclint-findings.pickle"
+        )
 
     def validate_rules(self, rulesfile, rules):
         """Validate rules read from rules file."""
@@ -217,6 +385,27 @@ class AppUI(object):
                 failed = True
             else:
                 rule["test"] = rule["test"].strip()
+                try:
+                    rule["code"] = compile(
+                        rule["test"],
+                        "{} rule {}".format(rulesfile, rule_id),
+                        "eval"
+                    )
+                    rule["cross_item"] = bool(
+                        code_names(rule["code"]) & CROSS_ITEM_NAMES
+                    )
+                except SyntaxError as ex:
+                    # SyntaxError probably means that the test is a
+                    # statement, not an expression.
+                    self.error(
+                        "Syntax error in {} rule in {}:\n{}\n{}".format(
+                            rule_id,
+                            rulesfile,
+                            rule["test"],
+                            ex
+                        )
+                    )
+                    failed = True
 
             if "message" not in rule:
                 self.error(
@@ -256,6 +445,7 @@ class AppUI(object):
                     constants_and_rules["constants"],
                     self.eval_locals
                 )
+                self.constants.update(constants_and_rules["constants"])
             if "rules" in constants_and_rules:
                 file_rules = constants_and_rules["rules"]
                 # print(yaml.dump(file_rules, default_flow_style=False))
@@ -273,37 +463,110 @@ class AppUI(object):
                     ):
                         self.rules[rule_id] = rule
 
+        # Bucket the rules by itemtype so that checking an item only
+        # visits the rules that apply to it.
+        self.rules_by_itemtype = {}
+        for rule_id, rule in self.rules.items():
+            self.rules_by_itemtype.setdefault(rule["itemtype"], []).append(
+                (rule_id, rule)
+            )
+        for itemtype, rules in self.rules_by_itemtype.items():
+            if all(rule["cross_item"] for _, rule in rules):
+                continue
+            self.rules_hashes[itemtype] = hashlib.md5(
+                repr((
+                    self.config.get("website", "base_url"),
+                    sorted(
+                        (name, repr(value))
+                        for name, value in self.constants.items()
+                    ),
+                    sorted(
+                        (rule_id, rule["test"], rule["message"])
+                        for rule_id, rule in rules
+                    )
+                ))
+            ).hexdigest()
+
     def checks_completed(self):
         """Notify user that time consuming checks are complete."""
         pass
 
+    def findings_found(self, findings):
+        """Notify user of findings as soon as they are found."""
+        pass
+
+    def check_progress(self, itemtype, n_checked, n_items):
+        """Notify user of the progress of checking a list of items."""
+        pass
+
+    def prefetch_exports(self, cc_browser):
+        """
+        Download all needed exports up front (concurrently if
+        export_concurrency is configured).
+        """
+        # pylint: disable=no-self-use
+        cc_browser.prefetch_exports()
+
     def clear_finding_list(self):
         """Clear finding list."""
         pass
 
+    def set_items(self, items):
+        """Set the list of items that rule tests can refer to."""
+        item_index = ItemIndex(items, self.eval_locals)
+        self.eval_locals["items"] = items
+        self.eval_locals["group"] = item_index.group
+        self.eval_locals["count_where"] = item_index.count_where
+
     def check_item(self, itemtype, item, item_name):
         """Check item for problems."""
 
         findings = []
-        eval_globals = {"__builtins__": {"len": len, "re": re}}
         self.eval_locals["item"] = item
 
-        for rule_id, rule in self.rules.items():
-            # Skip rules that do not apply to this itemtype.
-            if rule["itemtype"] != itemtype:
+        # Reuse the findings of the single item rules if neither the
+        # item nor the rules have changed since they were cached.
+        use_cache = (
+            self.findings_cache is not None and
+            itemtype in self.rules_hashes
+        )
+        cached = None
+        if use_cache:
+            cache_key = (
+                itemtype,
+                item_name,
+                item_hash(item),
+                self.rules_hashes[itemtype]
+            )
+            cached = self.findings_cache.get(cache_key)
+            self.used_cache_keys.add(cache_key)
+        new_cached = {}
+
+        for rule_id, rule in self.rules_by_itemtype.get(itemtype, []):
+            if cached is not None and not rule["cross_item"]:
+                if rule_id in cached:
+                    findings.append(cached[rule_id])
                 continue
 
-            try:
-                success = eval(rule["test"], eval_globals, self.eval_locals)
-            except SyntaxError:
-                # SyntaxError probably means that the test is a statement,
-                # not an expression.
-                self.fatal(
-                    "Syntax error in {} rule:\n{}".format(
-                        rule_id,
-                        rule["test"]
-                    )
+            if self.rule_stats is None:
+                success = eval(
+                    rule["code"],
+                    self.eval_globals,
+                    self.eval_locals
+                )
+            else:
+                start = timeit.default_timer()
+                success = eval(
+                    rule["code"],
+                    self.eval_globals,
+                    self.eval_locals
                 )
+                elapsed = timeit.default_timer() - start
+                stats = self.rule_stats.setdefault(rule_id, [0, 0.0, 0])
+                stats[0] += 1
+                stats[1] += elapsed
+                if not success:
+                    stats[2] += 1
             if not success:
                 try:
                     # pylint: disable=W0142
@@ -313,23 +576,129 @@ class AppUI(object):
                 url = item_edit_url(self.config, itemtype, item)
                 finding = (itemtype, item_name, rule_id, message, url)
                 findings.append(finding)
+                if not rule["cross_item"]:
+                    new_cached[rule_id] = finding
+
+        if use_cache and cached is None:
+            self.findings_cache[cache_key] = new_cached
 
         return findings
 
+    def check_items(self, itemtype, items, display_name):
+        """Check a list of items, returning a list of findings."""
+        self.set_items(items)
+        findings = []
+        for n_checked, item in enumerate(items):
+            if n_checked % PROGRESS_INTERVAL == 0:
+                self.check_progress(itemtype, n_checked, len(items))
+            item_findings = self.check_item(
+                itemtype,
+                item,
+                display_name(item)
+            )
+            self.findings_found(item_findings)
+            findings.extend(item_findings)
+        self.check_progress(itemtype, len(items), len(items))
+        return findings
+
+    def merge_rule_stats(self, rule_stats):
+        """Add rule statistics (e.g., from a pool worker)."""
+        for rule_id, (evaluations, seconds, failures) in rule_stats.items():
+            stats = self.rule_stats.setdefault(rule_id, [0, 0.0, 0])
+            stats[0] += evaluations
+            stats[1] += seconds
+            stats[2] += failures
+
+    def report_rule_stats(self):
+        """Output the rule statistics, most expensive rule first."""
+        lines = [
+            "{:<10} {:>10} {:>12} {:>12} {:>10}".format(
+                "Rule",
+                "Evals",
+                "Total (s)",
+                "Mean (us)",
+                "Failures"
+            )
+        ]
+        for rule_id, (evaluations, seconds, failures) in sorted(
+            self.rule_stats.items(),
+            key=lambda rule_id_stats: (
+                -rule_id_stats[1][1],
+                rule_id_stats[0]
+            )
+        ):
+            lines.append(
+                "{:<10} {:>10} {:>12.3f} {:>12.1f} {:>10}".format(
+                    rule_id,
+                    evaluations,
+                    seconds,
+                    1e6 * seconds / evaluations,
+                    failures
+                )
+            )
+        report = "\n".join(lines) + "\n"
+
+        if self.args.profile == "-":
+            sys.stderr.write(report)
+        else:
+            try:
+                with open(self.args.profile, "w") as profile_file:
+                    profile_file.write(report)
+            except IOError as ex:
+                self.error("Cannot write profile: {}".format(ex))
+
+    def load_findings_cache(self):
+        """Load the cached findings of previous runs."""
+        self.findings_cache = {}
+        try:
+            with open(self.findings_cache_filename, "rb") as cache_file:
+                self.findings_cache = pickle.load(cache_file)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+
+    def save_findings_cache(self):
+        """Save the cached findings of the items checked by this run."""
+        if self.findings_cache is None:
+            return
+        self.findings_cache = dict(
+            (key, value)
+            for key, value in self.findings_cache.items()
+            if key in self.used_cache_keys
+        )
+        try:
+            with open(self.findings_cache_filename, "wb") as cache_file:
+                pickle.dump(
+                    self.findings_cache,
+                    cache_file,
+                    pickle.HIGHEST_PROTOCOL
+                )
+        except IOError as ex:
+            self.warning("Cannot save findings cache: {}".format(ex))
+
     def run_checks_core(self):
         """Run all checks, returning a list of findings."""
 
         self.clear_finding_list()
 
         findings = []
-
-        # Create a connection to CoreCommerce.
+        if self.args.incremental and self.findings_cache is None:
+            self.load_findings_cache()
+        self.used_cache_keys = set()
+        if self.rule_stats is not None:
+            self.rule_stats = {}
+
+        # Create a connection to CoreCommerce.  Stale cache files are
+        # not used when the cache is being refreshed.
+        browser_options = cctools.get_browser_options(self.config)
+        if self.args.refresh_cache:
+            browser_options.pop("cache_max_age", None)
         cc_browser = cctools.CCBrowser(
             self.config.get("website", "base_url"),
             self.config.get("website", "username"),
             self.config.get("website", "password"),
             clean=self.args.clean,
-            cache_ttl=0 if self.args.refresh_cache else self.args.cache_ttl
+            cache_ttl=0 if self.args.refresh_cache else self.args.cache_ttl,
+            **browser_options
         )
 
         # Any subsequent calls should ignore the cache.  If the user
@@ -337,17 +706,16 @@ class AppUI(object):
         # something in CoreCommerce.
         self.args.refresh_cache = True
 
+        self.prefetch_exports(cc_browser)
+
         # Check category list.
-        categories = cc_browser.get_categories()
-        self.eval_locals["items"] = categories
-        for category in categories:
-            findings.extend(
-                self.check_item(
-                    "category",
-                    category,
-                    category["Category Name"]
-                )
+        findings.extend(
+            self.check_items(
+                "category",
+                cc_browser.get_categories(),
+                category_display_name
             )
+        )
 
         # Check products list.
         cc_browser.guess_product_ids()
@@ -355,35 +723,30 @@ class AppUI(object):
             cc_browser.get_products(),
             key=cc_browser.product_key_by_cat_and_name
         )
-        self.eval_locals["items"] = products
-        findings.extend(check_skus(self.config, products))
+        sku_findings = check_skus(self.config, products)
+        self.findings_found(sku_findings)
+        findings.extend(sku_findings)
         for product in products:
             for key in ["Teaser"]:
                 product[key] = cctools.html_to_plain_text(product[key])
-            findings.extend(
-                self.check_item(
-                    "product",
-                    product,
-                    product_display_name(product)
-                )
-            )
+        findings.extend(
+            self.check_items("product", products, product_display_name)
+        )
 
-        # Check variants list.
+        # Check variants list.  The variant rules check personalization
+        # answers.
         variants = sorted(
-            cc_browser.get_variants(),
-            key=cc_browser.variant_key_by_cat_product
+            cc_browser.get_personalizations(),
+            key=cc_browser.personalization_key_by_cat_product
         )
         add_is_first_answer_flag(variants)
-        self.eval_locals["items"] = variants
-        for variant in variants:
-            findings.extend(
-                self.check_item(
-                    "variant",
-                    variant,
-                    variant_display_name(variant)
-                )
-            )
+        findings.extend(
+            self.check_items("variant", variants, variant_display_name)
+        )
 
+        self.save_findings_cache()
+        if self.rule_stats is not None:
+            self.report_rule_stats()
         self.checks_completed()
 
         return findings
@@ -425,8 +788,17 @@ class AppUI(object):
             first = False
 
 
+class ChecksCancelled(Exception):
+    """Raised in the checks worker thread when the user cancels checks."""
+    pass
+
+
 class AppGUI(AppUI):
-    """Application graphical user interface."""
+    """
+    Application graphical user interface.  Checks run in a worker
+    thread, which sends findings and progress to the Tk main thread
+    through a queue.
+    """
     # http://www.tkdocs.com/tutorial
     # http://www.tkdocs.com/tutorial/tree.html
     # https://www.daniweb.com/software-development/\
@@ -437,6 +809,11 @@ class AppGUI(AppUI):
         AppUI.__init__(self, args)
         self.root = root
         self.tree_item_finding = {}
+        self.item_col_width = 0
+        self.main_thread = threading.current_thread()
+        self.queue = Queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
         self.frame = Tkinter.Frame(root)
         self.frame.pack(fill="both", expand=True)
 
@@ -495,6 +872,15 @@ class AppGUI(AppUI):
         )
         self.recheck_button.pack(side=Tkinter.LEFT, padx=5, pady=5)
 
+        # Cancel button
+        self.cancel_button = Tkinter.Button(
+            buttons_frame,
+            text="Cancel",
+            command=self.cancel_checks,
+            state=Tkinter.DISABLED
+        )
+        self.cancel_button.pack(side=Tkinter.LEFT, padx=5, pady=5)
+
         # Quit button
         self.quit_button = Tkinter.Button(
             buttons_frame,
@@ -503,9 +889,18 @@ class AppGUI(AppUI):
         )
         self.quit_button.pack(side=Tkinter.LEFT, padx=5, pady=5)
 
+        # Progress bar
+        self.progress_bar = ttk.Progressbar(
+            buttons_frame,
+            orient="horizontal",
+            length=200,
+            mode="determinate"
+        )
+        self.progress_bar.pack(side=Tkinter.LEFT, padx=5, pady=5)
+
         # Logging label
-        logging_label = Tkinter.Label(buttons_frame)
-        logging_label.pack(side=Tkinter.LEFT, padx=5, pady=5)
+        self.logging_label = Tkinter.Label(buttons_frame)
+        self.logging_label.pack(side=Tkinter.LEFT, padx=5, pady=5)
 
         # Configure window resizing.
         self.root.minsize(
@@ -518,8 +913,7 @@ class AppGUI(AppUI):
         # Configure logging.
         logging.basicConfig(level=logging.INFO)
         logger = logging.getLogger()
-        self.label_logging_handler = self.LabelLoggingHandler(logging_label)
-        logger.addHandler(self.label_logging_handler)
+        logger.addHandler(self.QueueLoggingHandler(self.queue))
 
         self.load_config_and_rules()
 
@@ -529,28 +923,25 @@ class AppGUI(AppUI):
 
         # Set window title.
         self.root.title(
-            "cclint - {}".format(self.config.get("base_url"))
+            "cclint - {}".format(self.config.get("website", "base_url"))
         )
 
+        self.root.after(QUEUE_POLL_MS, self.poll_queue)
         self.run_checks()
 
-    class LabelLoggingHandler(logging.Handler):
-        """A logging Handler that displays records in a main window label."""
-        def __init__(self, logging_label):
+    class QueueLoggingHandler(logging.Handler):
+        """
+        A logging Handler that sends records to the main window label
+        through the GUI queue, so that it can be used by any thread.
+        """
+        def __init__(self, queue):
             logging.Handler.__init__(self, level=logging.INFO)
             self.setFormatter(logging.Formatter('%(msg)s'))
-            self.logging_label = logging_label
+            self.queue = queue
 
         def emit(self, record):
             """Override the default handler's emit method."""
-            message = self.format(record)
-            self.logging_label.configure(text=message)
-            self.logging_label.update()
-
-        def blank(self):
-            """Clear the displayed text."""
-            self.logging_label.configure(text="")
-            self.logging_label.update()
+            self.queue.put(("status", self.format(record)))
 
     def copy_to_clipboard(self, _):
         """Copy selected finding to clipboard."""
@@ -560,18 +951,165 @@ class AppGUI(AppUI):
             self.root.clipboard_clear()
             self.root.clipboard_append(finding_to_string(finding) + "\n")
 
+    def run_checks(self):
+        """Start running all checks in a worker thread."""
+        if self.worker is not None and self.worker.is_alive():
+            return
+        self.cancel_event.clear()
+        self.recheck_button.configure(state=Tkinter.DISABLED)
+        self.cancel_button.configure(state=Tkinter.NORMAL)
+        self.worker = threading.Thread(target=self.run_checks_worker)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def run_checks_worker(self):
+        """Run all checks (in the worker thread)."""
+        try:
+            self.run_checks_core()
+        except ChecksCancelled:
+            self.queue.put(("cancelled", None))
+        except Exception as ex:  # pylint: disable=broad-except
+            self.queue.put(("error", str(ex)))
+        self.queue.put(("done", None))
+
+    def cancel_checks(self):
+        """Ask the worker thread to stop checking."""
+        self.cancel_event.set()
+        self.cancel_button.configure(state=Tkinter.DISABLED)
+        self.logging_label.configure(text="Cancelling...")
+
+    def poll_queue(self):
+        """Process the messages sent by the worker thread."""
+        findings = []
+        try:
+            while True:
+                kind, value = self.queue.get_nowait()
+                if kind == "findings":
+                    findings.extend(value)
+                    continue
+
+                # Keep findings in order with other messages.
+                self.insert_findings(findings)
+                findings = []
+                if kind == "clear":
+                    self.reset_tree()
+                elif kind == "progress":
+                    itemtype, n_checked, n_items = value
+                    self.progress_bar.configure(
+                        maximum=max(n_items, 1),
+                        value=n_checked
+                    )
+                    self.logging_label.configure(
+                        text="Checking {}s ({} of {})".format(
+                            itemtype,
+                            n_checked,
+                            n_items
+                        )
+                    )
+                elif kind == "downloading":
+                    self.progress_bar.configure(value=0)
+                    self.logging_label.configure(
+                        text="Downloading exports ({:.0f} seconds)".format(
+                            value
+                        )
+                    )
+                elif kind == "status":
+                    self.logging_label.configure(text=value)
+                elif kind == "completed":
+                    self.progress_bar.configure(value=0)
+                    self.logging_label.configure(text="")
+                elif kind == "cancelled":
+                    self.progress_bar.configure(value=0)
+                    self.logging_label.configure(text="Checks cancelled")
+                elif kind == "warning":
+                    tkMessageBox.showwarning("Warning", value)
+                elif kind == "error":
+                    self.progress_bar.configure(value=0)
+                    self.logging_label.configure(text="")
+                    tkMessageBox.showerror("Error", value)
+                elif kind == "done":
+                    self.recheck_button.configure(state=Tkinter.NORMAL)
+                    self.cancel_button.configure(state=Tkinter.DISABLED)
+        except Queue.Empty:
+            pass
+        self.insert_findings(findings)
+        self.root.after(QUEUE_POLL_MS, self.poll_queue)
+
     def checks_completed(self):
         """Notify user that time consuming checks are complete."""
-        self.label_logging_handler.blank()
+        self.queue.put(("completed", None))
+
+    def check_progress(self, itemtype, n_checked, n_items):
+        """Report progress, stopping the checks if they were cancelled."""
+        if self.cancel_event.is_set():
+            raise ChecksCancelled()
+        self.queue.put(("progress", (itemtype, n_checked, n_items)))
+
+    def prefetch_exports(self, cc_browser):
+        """
+        Download the exports in another thread, reporting progress and
+        stopping the checks if they are cancelled.  A cancelled
+        download is left to finish in the background; the export locks
+        keep a later run from reading it before it is complete.
+        """
+        errors = []
+
+        def prefetch():
+            """Download the exports, saving any exception."""
+            try:
+                cc_browser.prefetch_exports()
+            except Exception as ex:  # pylint: disable=broad-except
+                errors.append(ex)
+
+        downloader = threading.Thread(target=prefetch)
+        downloader.daemon = True
+        start_time = timeit.default_timer()
+        downloader.start()
+        while downloader.is_alive():
+            if self.cancel_event.is_set():
+                raise ChecksCancelled()
+            self.queue.put(
+                ("downloading", timeit.default_timer() - start_time)
+            )
+            downloader.join(DOWNLOAD_POLL_SECONDS)
+        if errors:
+            raise errors[0]
+        if self.cancel_event.is_set():
+            raise ChecksCancelled()
+
+    def findings_found(self, findings):
+        """Send findings to the main thread to be displayed."""
+        if findings:
+            self.queue.put(("findings", list(findings)))
 
     def clear_finding_list(self):
         """Clear finding list."""
+        self.queue.put(("clear", None))
+
+    def reset_tree(self):
+        """Clear the tree view, leaving an empty branch per itemtype."""
         self.tree_item_finding = {}
         for child in self.tree.get_children():
             self.tree.delete(child)
 
+        for itemtype in ("category", "product", "variant"):
+            self.tree.insert(
+                "",
+                "end",
+                itemtype,
+                text=itemtype,
+                open=True
+            )
+
+        # Starting minimum width of the Item column.
+        self.item_col_width = 100
+        self.tree.column("#0", width=self.item_col_width)
+
     def error(self, msg):
         """Display an error message."""
+        if threading.current_thread() is not self.main_thread:
+            self.queue.put(("error", str(msg)))
+            return
         tkMessageBox.showerror("Error", msg)
 
     def fatal(self, msg):
@@ -582,6 +1120,9 @@ class AppGUI(AppUI):
 
     def warning(self, msg):
         """Display a warning message."""
+        if threading.current_thread() is not self.main_thread:
+            self.queue.put(("warning", str(msg)))
+            return
         tkMessageBox.showwarning("Warning", msg)
 
     def edit_item(self):
@@ -594,49 +1135,36 @@ class AppGUI(AppUI):
         else:
             self.error("URL for item {} not found.".format(selected))
 
-    def display_findings(self, findings):
-        """Display findings in a tree view."""
-
-        # Starting minimum width of the Item column.
-        item_col_width = 100
+    def insert_findings(self, findings):
+        """Insert findings into the tree view."""
+        if not findings:
+            return
 
         # Second level items are indented.
         tree_indent = 38
 
-        # Insert findings into tree view.
-        for itemtype in ("category", "product", "variant"):
-            # Insert an itemtype branch.
-            self.tree.insert(
-                "",
+        font = tkFont.Font()
+        for finding in findings:
+            item_id = self.tree.insert(
+                finding[0],
                 "end",
-                itemtype,
-                text=itemtype,
-                open=True
+                "",
+                text=finding[1],
+                values=(finding[2], finding[3])
             )
-
-            # Insert findings of the same itemtype.
-            for finding in findings:
-                if finding[0] == itemtype:
-                    item_id = self.tree.insert(
-                        finding[0],
-                        "end",
-                        "",
-                        text=finding[1],
-                        values=(finding[2], finding[3])
-                    )
-                    self.tree_item_finding[item_id] = finding
-                    # Width returned by measure() appears to be 2
-                    # pixels too wide for each character.
-                    width = (
-                        tkFont.Font().measure(finding[1])
-                        - 2 * len(finding[1])
-                        + tree_indent
-                    )
-                    if item_col_width < width:
-                        item_col_width = width
+            self.tree_item_finding[item_id] = finding
+            # Width returned by measure() appears to be 2
+            # pixels too wide for each character.
+            width = (
+                font.measure(finding[1])
+                - 2 * len(finding[1])
+                + tree_indent
+            )
+            if self.item_col_width < width:
+                self.item_col_width = width
 
         # Set width of the Item column.
-        self.tree.column("#0", width=item_col_width)
+        self.tree.column("#0", width=self.item_col_width)
 
 
 class AppCLI(AppUI):
@@ -650,6 +1178,83 @@ class AppCLI(AppUI):
         self.run_checks()
 
 
+class AppBatch(AppUI):
+    """
+    Application batch user interface.  Items are checked by a pool of
+    processes, and findings are output as JSON lines as soon as they
+    are found.
+    """
+    # pylint: disable=no-self-use
+    def __init__(self, args):
+        AppUI.__init__(self, args)
+        self.n_findings = 0
+
+        self.load_config_and_rules()
+
+        self.run_checks()
+
+    def check_items(self, itemtype, items, display_name):
+        """Check a list of items in a pool of processes."""
+        # pylint: disable=W0603
+        global _POOL_APP
+
+        # Workers inherit the item list by forking.
+        n_jobs = min(self.args.jobs, len(items))
+        if n_jobs <= 1 or not hasattr(os, "fork"):
+            return AppUI.check_items(self, itemtype, items, display_name)
+
+        self.set_items(items)
+        _POOL_APP = self
+        chunk_size = max(1, len(items) // (n_jobs * 4))
+        chunks = [
+            (itemtype, start, start + chunk_size, display_name)
+            for start in range(0, len(items), chunk_size)
+        ]
+        findings = []
+        pool = multiprocessing.Pool(n_jobs)
+        try:
+            for chunk_findings, cache_entries, rule_stats in pool.imap(
+                check_items_chunk,
+                chunks
+            ):
+                if self.findings_cache is not None:
+                    self.findings_cache.update(cache_entries)
+                    self.used_cache_keys.update(cache_entries)
+                if rule_stats is not None:
+                    self.merge_rule_stats(rule_stats)
+                self.findings_found(chunk_findings)
+                findings.extend(chunk_findings)
+            pool.close()
+        finally:
+            pool.terminate()
+            _POOL_APP = None
+
+        return findings
+
+    def findings_found(self, findings):
+        """Output findings as JSON lines."""
+        for finding in findings:
+            itemtype, item_name, rule_id, message, url = finding
+            print(
+                json.dumps(
+                    {
+                        "itemtype": itemtype,
+                        "item": item_name,
+                        "rule": rule_id,
+                        "message": message,
+                        "url": url
+                    },
+                    sort_keys=True
+                )
+            )
+        sys.stdout.flush()
+        self.n_findings += len(findings)
+
+    def display_findings(self, findings):
+        """Findings have already been output by findings_found()."""
+        pass
+
+
 def main():
     """main"""
     default_config = os.path.join(
@@ -696,6 +1301,22 @@ def main():
         default=3600,
         help="cache TTL in seconds (default=%(default)i)"
     )
+    arg_parser.add_argument(
+        "--no-incremental",
+        action="store_false",
+        dest="incremental",
+        default=True,
+        help="check all items instead of reusing cached findings of "
+        "unchanged items"
+    )
+    arg_parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        metavar="FILE",
+        help="report the evaluations, time, and failures of each rule "
+        "to FILE (default=stderr); implies --no-incremental"
+    )
     arg_parser.add_argument(
         "--rule-ids",
         metavar="ID1,ID2,...",
@@ -707,6 +1328,21 @@ def main():
         default=False,
         help="display a GUI"
     )
+    arg_parser.add_argument(
+        "--batch",
+        action="store_true",
+        default=False,
+        help="output findings as JSON lines and exit with status 1 if "
+        "there are any"
+    )
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        default=multiprocessing.cpu_count(),
+        help="number of processes that check items in --batch mode "
+        "(default=%(default)i)"
+    )
     arg_parser.add_argument(
         "--verbose",
         action="store_true",
@@ -719,11 +1355,23 @@ def main():
     if args.rules is None:
         args.rules = [default_rules]
 
+    if args.gui and args.batch:
+        arg_parser.error("--gui and --batch are mutually exclusive")
+
+    # Cached findings would hide the rules that are not evaluated.
+    if args.profile:
+        args.incremental = False
+
     if args.gui:
+        if Tkinter is None:
+            arg_parser.error("--gui requires Tkinter (python-tk)")
         root = Tkinter.Tk()
         root.title("cclint")
         AppGUI(args, root)
         root.mainloop()
+    elif args.batch:
+        if AppBatch(args).n_findings > 0:
+            return 1
     else:
         AppCLI(args)
 
@@ -731,4 +1379,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
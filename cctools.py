@@ -31,12 +31,22 @@ equivalent to a OptionSetId.
 """
 
 from __future__ import print_function
+import cPickle as pickle
+import cStringIO
+import contextlib
 import csv
+import hashlib
 import json
 import logging
+import multiprocessing.pool
 import os
+import Queue
 import re
+import sqlite3
+import subprocess
+import sys
 import tempfile
+import threading
 import time
 
 import lockfile  # sudo apt-get install python-lockfile
@@ -77,6 +87,76 @@ def uniquify_header(line):
     return ",".join(fields) + "\n"
 
 
+def group_by(items, *keys):
+    """
+    Group a list of dictionaries by the values of one or more keys in a
+    single pass.  Return a dictionary that maps each tuple of key values
+    to the list of items with those values, in their original order.
+    """
+    groups = dict()
+    for item in items:
+        groups.setdefault(tuple(item[key] for key in keys), []).append(item)
+    return groups
+
+
+def total_inventory_levels(levels):
+    """
+    Return the total of inventory levels and whether any of them is
+    a problem (not a number, or negative).  A level that is not a
+    number counts as zero.
+    """
+    total = 0
+    err = False
+    for level in levels:
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            level = 0
+            err = True
+        if level < 0:
+            err = True
+        total += level
+    return total, err
+
+
+def format_inventory_total(total, err):
+    """Format an inventory total, prefixed with "(err) " if err."""
+    return "{}{}".format("(err) " if err else "", total)
+
+
+def get_browser_options(config):
+    """
+    Return a dictionary of optional CCBrowser keyword arguments read
+    from the [website] section of a cctools configuration.
+    """
+    options = dict()
+    if config.has_option("website", "export_concurrency"):
+        options["export_concurrency"] = config.getint(
+            "website",
+            "export_concurrency"
+        )
+    if config.has_option("website", "cache_max_age"):
+        options["cache_max_age"] = config.getfloat(
+            "website",
+            "cache_max_age"
+        )
+    if config.has_option("website", "catalog_db"):
+        options["catalog_db"] = config.getboolean("website", "catalog_db")
+    return options
+
+
+def format_age(seconds):
+    """Format an age in seconds as a short human readable string."""
+    if seconds < 120:
+        return "{:.0f} seconds".format(seconds)
+    elif seconds < 2 * 3600:
+        return "{:.0f} minutes".format(seconds / 60)
+    elif seconds < 2 * 86400:
+        return "{:.1f} hours".format(seconds / 3600)
+    else:
+        return "{:.1f} days".format(seconds / 86400)
+
+
 def repair_product_options_csv(fixed_filename, tmp_filename):
     """
     Repairs product_options CSV header which has duplicate keys.  Who exports
@@ -97,8 +177,264 @@ def repair_product_options_csv(fixed_filename, tmp_filename):
                 fixed_file.write(line)
 
 
+def _read_snapshot(filename, key, count):
+    """
+    Read a snapshot written by _write_snapshot().  Return the list of
+    its count objects, or None if the snapshot does not exist, has a
+    different key, or cannot be read.
+    """
+    try:
+        with open(filename, "rb") as snapshot_file:
+            if pickle.load(snapshot_file) != key:
+                return None
+            return [pickle.load(snapshot_file) for _ in range(count)]
+    except Exception:  # pylint: disable=broad-except
+        # A truncated or otherwise damaged pickle can raise almost any
+        # exception.  The snapshot is just rebuilt.
+        return None
+
+
+def _write_snapshot(filename, key, objects):
+    """
+    Write a key and a list of objects to a snapshot file.  The file is
+    replaced atomically, so a reader never sees a partial snapshot even
+    if the writer is killed or another process writes it at the same
+    time.
+    """
+    snapshot_file = tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(filename),
+        suffix=".tmp",
+        delete=False
+    )
+    try:
+        with snapshot_file:
+            pickle.dump(key, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            for obj in objects:
+                pickle.dump(obj, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.rename(snapshot_file.name, filename)
+    except Exception:
+        os.remove(snapshot_file.name)
+        raise
+
+
+def _quote_identifier(name):
+    """Quote a table or column name for use in an SQL statement."""
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _glob_escape(string):
+    """Escape the GLOB wildcard characters in a string."""
+    return re.sub(r"([*?[])", r"[\1]", string)
+
+
+class UnknownFieldError(KeyError):
+    """Raised by CCBrowser.query() for a field that the items lack."""
+    pass
+
+
+class CatalogDB(object):
+    """
+    SQLite store of cleaned exports and of the variants derived from
+    them.  Each list is kept in a table of the same name, with the rows
+    in list order and indexes on the columns that are commonly used for
+    lookups.
+    """
+
+    # Columns that are indexed if a table has them.
+    INDEXED_COLUMNS = (
+        "Category",
+        "Category Name",
+        "Product Id",
+        "Product Name",
+        "Product SKU",
+        "SKU"
+    )
+
+    def __init__(self, filename):
+        # Another process may be loading a large table.
+        self._connection = sqlite3.connect(
+            filename,
+            timeout=60,
+            check_same_thread=False
+        )
+        self._connection.text_factory = str
+        # The connection is shared by the threads of a process.
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS _tables"
+                " (name TEXT PRIMARY KEY, key TEXT, columns TEXT,"
+                " json_columns TEXT)"
+            )
+
+    def get_key(self, name):
+        """Return the key of the loaded table, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT key FROM _tables WHERE name = ?",
+                (name,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def load(self, name, key, rows):
+        """Replace a table with rows, a list of dictionaries."""
+        # Determine the columns in order of first appearance.  Columns
+        # with values that are not strings, such as the "Extra" list of
+        # the product_options export, or that are missing from some
+        # rows are stored as JSON so that they can be restored exactly.
+        # In a JSON column, NULL means that the row did not have the
+        # key.
+        columns = list()
+        json_columns = set()
+        for row in rows:
+            for column, value in row.items():
+                if column not in columns:
+                    columns.append(column)
+                if not (value is None or isinstance(value, basestring)):
+                    json_columns.add(column)
+        for row in rows:
+            for column in columns:
+                if column not in row:
+                    json_columns.add(column)
+
+        table = _quote_identifier(name)
+        quoted_columns = [_quote_identifier(column) for column in columns]
+        with self._lock, self._connection:
+            self._connection.execute("DROP TABLE IF EXISTS {}".format(table))
+            self._connection.execute(
+                "CREATE TABLE {} (_row INTEGER PRIMARY KEY{})".format(
+                    table,
+                    "".join(
+                        ", {} TEXT".format(column) for column in quoted_columns
+                    )
+                )
+            )
+            for column in columns:
+                if column in self.INDEXED_COLUMNS:
+                    self._connection.execute(
+                        "CREATE INDEX {} ON {} ({})".format(
+                            _quote_identifier(
+                                "{}_{}".format(name, column)
+                            ),
+                            table,
+                            _quote_identifier(column)
+                        )
+                    )
+            if columns:
+                self._connection.executemany(
+                    "INSERT INTO {} (_row, {}) VALUES (?, {})".format(
+                        table,
+                        ", ".join(quoted_columns),
+                        ", ".join("?" * len(columns))
+                    ),
+                    (
+                        [row_number] + [
+                            json.dumps(row[column])
+                            if column in json_columns and column in row
+                            else row.get(column)
+                            for column in columns
+                        ]
+                        for row_number, row in enumerate(rows)
+                    )
+                )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO _tables VALUES (?, ?, ?, ?)",
+                (
+                    name,
+                    key,
+                    json.dumps(columns),
+                    json.dumps(sorted(json_columns))
+                )
+            )
+
+    def _get_columns(self, name):
+        """Return the columns and the set of JSON columns of a table."""
+        # The column names are kept in the _tables table because the
+        # sqlite3 module truncates cursor.description names that
+        # contain " [", such as "Option Id [1]".
+        columns, json_columns = self._connection.execute(
+            "SELECT columns, json_columns FROM _tables WHERE name = ?",
+            (name,)
+        ).fetchone()
+        return json.loads(columns), set(json.loads(json_columns))
+
+    def _select(self, name, conditions):
+        """
+        Return the rows of a table, in order, that satisfy all of the
+        (column, operator, value) conditions, where operator is "IS"
+        (equals) or "GLOB" (starts with).  A JSON column is compared
+        with the JSON encoding of the value.  Raise KeyError if the
+        table does not have a column.
+        """
+        with self._lock:
+            columns, json_columns = self._get_columns(name)
+            if not columns:
+                # The table is empty.
+                return []
+            clauses = list()
+            params = list()
+            for column, op, value in conditions:
+                if column not in columns:
+                    raise KeyError(column)
+                clauses.append(
+                    "{} {} ?".format(_quote_identifier(column), op)
+                )
+                if column in json_columns:
+                    value = json.dumps(value)
+                    if op == "GLOB":
+                        # Leave the closing quote of a string open.
+                        value = value[:-1]
+                if op == "GLOB":
+                    value = _glob_escape(value) + "*"
+                params.append(value)
+            cursor = self._connection.execute(
+                "SELECT {} FROM {}{} ORDER BY _row".format(
+                    ", ".join(
+                        _quote_identifier(column) for column in columns
+                    ) or "_row",
+                    _quote_identifier(name),
+                    " WHERE " + " AND ".join(clauses) if clauses else ""
+                ),
+                params
+            )
+            rows = list()
+            for values in cursor:
+                row = dict()
+                for column, value in zip(columns, values):
+                    if column in json_columns:
+                        if value is not None:
+                            row[column] = json.loads(value)
+                    else:
+                        row[column] = value
+                rows.append(row)
+        return rows
+
+    def select(self, name, where=None):
+        """
+        Return the rows of a table, in order, as a list of
+        dictionaries.  If where is specified, only rows whose columns
+        equal all of the values in the where dictionary are returned.
+        A value of None matches a column that is None.
+        """
+        return self._select(
+            name,
+            [(column, "IS", value) for column, value in (where or {}).items()]
+        )
+
+    def select_prefix(self, name, column, prefix):
+        """Return the rows of a table whose column starts with prefix."""
+        return self._select(
+            name,
+            [(column, "GLOB", prefix)]
+        )
+
+
 class CCBrowser(object):
     """Encapsulate mechanize.Browser object."""
+
+    # Exports that can be downloaded from CoreCommerce, slowest first.
+    EXPORTS = ("products", "personalizations", "product_options", "categories")
+
     def __init__(
         self,
         base_url,
@@ -106,7 +442,10 @@ class CCBrowser(object):
         password,
         clean=True,
         cache_ttl=3600,
-        proxy=None
+        proxy=None,
+        export_concurrency=1,
+        cache_max_age=None,
+        catalog_db=False
     ):
         self._base_url = base_url
         self._admin_url = self._base_url + "/admin/index.php"
@@ -114,22 +453,65 @@ class CCBrowser(object):
         self._password = password
         self._clean = clean
         self._cache_ttl = float(cache_ttl)
+        # If cache_max_age is specified, expired cache files that are
+        # younger than cache_max_age are used as is while they are
+        # refreshed in the background (stale-while-revalidate).
+        self._cache_max_age = (
+            None if cache_max_age is None else float(cache_max_age)
+        )
         self._cache_dir = os.path.join(xdg_cache_home, "cctools")
         if not os.path.exists(self._cache_dir):
             os.mkdir(self._cache_dir, 0o700)
-        # A single lockfile is used for all download operations.  We
-        # have no idea if the CoreCommerce ajax_export can support
-        # simultaneous downloads so we play it safe.  The lockfile
-        # module will append ".lock" to the filename.
-        self._download_lock_filename = os.path.join(
-            self._cache_dir,
-            "download"
-        )
-        self._browser = mechanize.Browser()
-        self._browser.set_handle_robots(False)
-        if proxy is not None:
-            self._browser.set_proxies({"https": proxy})
-        self._logged_in = False
+        # Maximum number of exports to download simultaneously.  Each
+        # simultaneous export runs on its own logged in session
+        # because the ajax_export state is kept per session.
+        self._export_concurrency = max(1, int(export_concurrency))
+        self._proxy = proxy
+        # Optionally keep the exports and variants in an indexed SQLite
+        # database as well, see query().
+        if catalog_db:
+            self._catalog_db = CatalogDB(
+                os.path.join(self._cache_dir, "catalog.sqlite")
+            )
+        else:
+            self._catalog_db = None
+        # Tables of the catalog database known to be current.
+        self._catalog_db_current = set()
+        self._logged_in = set()
+        # Map of browser to (session slot, cookie jar).
+        self._sessions = dict()
+        self._browser = self._new_browser(0)
+        # Exports downloaded by this object.  They are not expired even
+        # if cache_ttl is zero.
+        self._fresh_exports = set()
+        # Exports being refreshed in the background.
+        self._revalidating = set()
+        self._personalizations = None
+        self._product_options = None
+        self._option_sets = None
+        self._option_groups = None
+        self._options = None
+        self._variants = None
+        self._questions = None
+        self._products = None
+        self._categories = None
+        self._category_sort = None
+        # Lazily built lookup indexes, see get_index().
+        self._indexes = dict()
+        # Map of export name to the snapshot key of the loaded rows,
+        # see _read_export().
+        self._export_keys = dict()
+        # Inventory roll-ups, see add_product_inventory_rollups().
+        self._inventory_rollups = None
+        self._product_rollups_added = False
+        self._category_rollups_added = False
+
+    def reload(self):
+        """
+        Discard the loaded exports and everything derived from them
+        (lists, indexes and category sort order) so that they are read
+        again, from a possibly refreshed cache, on next use.
+        """
         self._personalizations = None
         self._product_options = None
         self._option_sets = None
@@ -140,27 +522,214 @@ class CCBrowser(object):
         self._products = None
         self._categories = None
         self._category_sort = None
+        self._indexes = dict()
+        self._export_keys = dict()
+        self._catalog_db_current = set()
+        self._inventory_rollups = None
+        self._product_rollups_added = False
+        self._category_rollups_added = False
+
+    def get_index(self, name, *keys):
+        """
+        Return a dictionary that maps tuples of key values to the list
+        of items returned by get_<name>() (e.g., get_products()) with
+        those values.  The index is built in a single pass the first
+        time it is requested and is kept until reload() is called.
+        """
+        index_key = (name,) + keys
+        if index_key not in self._indexes:
+            items = getattr(self, "get_{}".format(name))()
+            self._indexes[index_key] = group_by(items, *keys)
+        return self._indexes[index_key]
+
+    # Lists that are kept in the catalog database.
+    _CATALOG_DB_TABLES = EXPORTS + ("variants",)
 
-    def _select_form(self, name):
+    def _use_catalog_db(self, name):
+        """
+        Determine if a query of get_<name>() should use the catalog
+        database, which is only worthwhile if the list is not loaded.
+        """
+        return (
+            self._catalog_db is not None and
+            name in self._CATALOG_DB_TABLES and
+            getattr(self, "_{}".format(name)) is None
+        )
+
+    def query(self, name, where):
+        """
+        Return the items of get_<name>() (e.g., get_products()) whose
+        values equal all of the values in the where dictionary, in
+        list order.  If catalog_db is enabled and the list has not been
+        loaded, this is an indexed query of the catalog database that
+        does not load the list, and the items are copies.  Otherwise
+        the items are looked up in get_index().  Raise
+        UnknownFieldError if the items do not have a where field.
+        """
+        if self._use_catalog_db(name):
+            self._sync_catalog_db(name)
+            try:
+                return self._catalog_db.select(name, where)
+            except KeyError as ex:
+                raise UnknownFieldError(*ex.args)
+
+        fields = sorted(where)
+        getattr(self, "get_{}".format(name))()
+        try:
+            index = self.get_index(name, *fields)
+        except KeyError as ex:
+            raise UnknownFieldError(*ex.args)
+        return index.get(tuple(where[field] for field in fields), [])
+
+    def query_prefix(self, name, field, prefix):
+        """
+        Return the items of get_<name>() whose field starts with
+        prefix, in list order.  Like query(), this uses the catalog
+        database if the list has not been loaded.
+        """
+        if self._use_catalog_db(name):
+            self._sync_catalog_db(name)
+            try:
+                return self._catalog_db.select_prefix(name, field, prefix)
+            except KeyError as ex:
+                raise UnknownFieldError(*ex.args)
+
+        items = getattr(self, "get_{}".format(name))()
+        try:
+            return [item for item in items if item[field].startswith(prefix)]
+        except KeyError as ex:
+            raise UnknownFieldError(*ex.args)
+
+    def _get_export_key(self, name):
+        """
+        Return the snapshot key (see _read_export()) of the loaded rows
+        of an export, or, if it has not been loaded, of the cached
+        export, which is downloaded first if it has expired.
+        """
+        if name in self._export_keys:
+            return self._export_keys[name]
+        with self._updated_export(name, self._browser):
+            with open(self._export_filename(name), "rb") as csv_file:
+                data = csv_file.read()
+            return self._make_export_key(
+                name,
+                data,
+                self._EXPORT_READER_ARGS.get(name, {})
+            )
+
+    def _get_catalog_db_key(self, name):
+        """Return the key of the current version of a list."""
+        if name == "variants":
+            return repr(
+                [
+                    self._get_export_key(export_name)
+                    for export_name in self._VARIANT_EXPORTS
+                ]
+            )
+        return repr(self._get_export_key(name))
+
+    def _sync_catalog_db(self, name):
+        """Make sure that the table of a list in the catalog is current."""
+        if name in self._catalog_db_current:
+            return
+        if self._catalog_db.get_key(name) != self._get_catalog_db_key(name):
+            # Loading the list stores it, see _store_in_catalog_db().
+            getattr(self, "get_{}".format(name))()
+        self._catalog_db_current.add(name)
+
+    def _store_in_catalog_db(self, name, key, rows):
+        """
+        Store a loaded list with the key of its version in the catalog
+        database (if enabled) unless it is already there.
+        """
+        if self._catalog_db is None:
+            return
+        key = repr(key)
+        if self._catalog_db.get_key(name) != key:
+            self._catalog_db.load(name, key, rows)
+        self._catalog_db_current.add(name)
+
+    def _session_filename(self, slot):
+        """
+        Return the filename of the persistent cookie jar for a session
+        slot.  The name depends upon the site and username so that a
+        session is never reused for a different login.
+        """
+        login_hash = hashlib.md5(
+            "{}\n{}".format(self._base_url, self._username)
+        ).hexdigest()[:8]
+        return os.path.join(
+            self._cache_dir,
+            "session-{}-{}.cookies".format(login_hash, slot)
+        )
+
+    def _new_browser(self, slot):
+        """
+        Create a new mechanize.Browser (a new session).  The session
+        cookies are persisted in the cache directory so that a later
+        process using the same slot can skip logging in.
+        """
+        browser = mechanize.Browser()
+        browser.set_handle_robots(False)
+        if self._proxy is not None:
+            browser.set_proxies({"https": self._proxy})
+
+        cookiejar = mechanize.LWPCookieJar(self._session_filename(slot))
+        if os.path.exists(cookiejar.filename):
+            try:
+                # Session cookies are marked as discard, keep them.
+                cookiejar.load(ignore_discard=True)
+            except (IOError, mechanize.LoadError) as ex:
+                LOGGER.debug("Ignoring saved session: {}".format(ex))
+                cookiejar.clear()
+        browser.set_cookiejar(cookiejar)
+        self._sessions[browser] = (slot, cookiejar)
+
+        # Assume that a saved session is still logged in.  If it is
+        # not, _open() will login again.
+        if len(cookiejar) > 0:
+            self._logged_in.add(browser)
+
+        return browser
+
+    def _session_lock(self, browser):
+        """
+        Return a lock that serializes use of a session slot by multiple
+        processes.
+        """
+        slot = self._sessions[browser][0]
+        return lockfile.FileLock(self._session_filename(slot))
+
+    def _save_session(self, browser):
+        """Save the session cookies readable only by the user."""
+        cookiejar = self._sessions[browser][1]
+        os.close(
+            os.open(cookiejar.filename, os.O_WRONLY | os.O_CREAT, 0o600)
+        )
+        os.chmod(cookiejar.filename, 0o600)
+        cookiejar.save(ignore_discard=True)
+
+    @staticmethod
+    def _select_form(browser, name):
         """Select a form in the browser."""
         try:
-            self._browser.select_form(name)
+            browser.select_form(name)
         except mechanize.FormNotFoundError as ex:
             # If the form is not found, and the form list only
             # contains "digiSHOP", then the hostname is probably
             # wrong.  "digiSHOP" is on a redirected login page.
             # Change the requested name to "digiSHOP" and then print
-            # self._browser.form to see clues.
+            # browser.form to see clues.
             forms = []
-            for form in self._browser.forms():
+            for form in browser.forms():
                 forms.append(form.name)
             raise type(ex)(str(ex) + " in {}".format(forms))
 
-    def _login(self):
+    def _login(self, browser):
         """Login to site."""
 
         # No need to login if we have already done so.
-        if self._logged_in:
+        if browser in self._logged_in:
             return
 
         # Log time consuming step.
@@ -168,18 +737,44 @@ class CCBrowser(object):
         LOGGER.debug("Username = {}".format(self._username))
 
         # Open the login page.
-        self._browser.open(self._admin_url)
+        browser.open(self._admin_url)
 
         # Find the login form.
-        self._select_form("digiSHOP")
+        self._select_form(browser, "digiSHOP")
 
         # Set the form values.
-        self._browser["userId"] = self._username
-        self._browser["password"] = self._password
+        browser["userId"] = self._username
+        browser["password"] = self._password
 
         # Submit the form (press the "Login" button).
-        self._browser.submit()
-        self._logged_in = True
+        browser.submit()
+        self._logged_in.add(browser)
+        self._save_session(browser)
+
+    @staticmethod
+    def _is_login_page(browser):
+        """Determine if the browser is displaying the login page."""
+        if not browser.viewing_html():
+            return False
+        for form in browser.forms():
+            if form.name == "digiSHOP":
+                return True
+        return False
+
+    def _open(self, browser, url):
+        """
+        Open an URL, logging in if necessary.  If the server rejects a
+        saved session by displaying the login page, login again.
+        """
+        self._login(browser)
+        response = browser.open(url)
+        if self._is_login_page(browser):
+            LOGGER.info("Saved session expired")
+            self._logged_in.discard(browser)
+            self._sessions[browser][1].clear()
+            self._login(browser)
+            response = browser.open(url)
+        return response
 
     def _is_file_expired(self, filename):
         """Determine if a file doesn't exist or has expired."""
@@ -190,7 +785,271 @@ class CCBrowser(object):
         now = time.time()
         return expire_time < now
 
-    def _do_export(self, url, filename):
+    def _export_filename(self, name):
+        """Return the cache filename of an export."""
+        return os.path.join(self._cache_dir, "{}.csv".format(name))
+
+    def _export_lock(self, name):
+        """
+        Return a lock that serializes downloading and reading of an
+        export.  Each export has its own lock so that different exports
+        can be downloaded at the same time.  The lockfile module will
+        append ".lock" to the filename.
+        """
+        return lockfile.FileLock(os.path.join(self._cache_dir, name))
+
+    def _is_export_expired(self, name):
+        """Determine if an export must be downloaded."""
+        if name in self._fresh_exports:
+            return False
+        return self._is_file_expired(self._export_filename(name))
+
+    @property
+    def cache_dir(self):
+        """Directory of the cached exports."""
+        return self._cache_dir
+
+    def get_export_time(self, name):
+        """
+        Return the time (seconds since the epoch) that a cached export
+        was downloaded.
+        """
+        return os.stat(self._export_filename(name)).st_mtime
+
+    def _export_age(self, name):
+        """Return the age in seconds of a cached export."""
+        return time.time() - os.stat(self._export_filename(name)).st_mtime
+
+    def _is_export_usable_stale(self, name):
+        """
+        Determine if an expired export can be used while it is being
+        refreshed in the background.
+        """
+        return (
+            self._cache_max_age is not None and
+            os.path.exists(self._export_filename(name)) and
+            self._export_age(name) < self._cache_max_age
+        )
+
+    def _start_background_refresh(self, names):
+        """
+        Refresh exports in a background process so that the caller can
+        continue using the stale cache files.  The process runs a new
+        Python interpreter (see _revalidate_main()) rather than a fork
+        of this one, which may have other threads holding locks.  The
+        caller must not hold the export locks.
+        """
+        names = [name for name in names if name not in self._revalidating]
+        if len(names) == 0:
+            return
+        self._revalidating.update(names)
+        LOGGER.info("Refreshing {} in the background".format(", ".join(names)))
+
+        # The login is passed on stdin so that the password is not
+        # visible in the process list.  The output is discarded so
+        # that a pipeline reading our output is not held open.
+        with open(os.devnull, "r+b") as devnull:
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-c",
+                    "import sys; sys.path.insert(0, sys.argv[1]); "
+                    "import cctools; cctools._revalidate_main()",
+                    os.path.dirname(os.path.abspath(__file__))
+                ],
+                stdin=subprocess.PIPE,
+                stdout=devnull,
+                stderr=devnull,
+                close_fds=True
+            )
+        json.dump(
+            {
+                "base_url": self._base_url,
+                "username": self._username,
+                "password": self._password,
+                "clean": self._clean,
+                "cache_ttl": self._cache_ttl,
+                "proxy": self._proxy,
+                "export_concurrency": self._export_concurrency,
+                "names": names
+            },
+            process.stdin
+        )
+        process.stdin.close()
+
+    def _update_export(self, name, browser):
+        """
+        Download an export to the cache if it has expired.  The caller
+        must hold the export lock.  Return True if the export is stale
+        and must be refreshed in the background once the lock has been
+        released.
+        """
+        refresh = False
+        if self._is_export_expired(name):
+            if self._is_export_usable_stale(name):
+                refresh = True
+            else:
+                download = getattr(self, "_download_{}_csv".format(name))
+                with self._session_lock(browser):
+                    download(browser, self._export_filename(name))
+                self._fresh_exports.add(name)
+        LOGGER.info(
+            "Using {} data downloaded {} ago".format(
+                name,
+                format_age(self._export_age(name))
+            )
+        )
+        return refresh
+
+    @contextlib.contextmanager
+    def _updated_export(self, name, browser):
+        """
+        Download an export to the cache if it has expired, and hold its
+        lock while the with block reads it.  If a stale export is used,
+        its background refresh is started after the lock is released.
+        """
+        with self._export_lock(name):
+            refresh = self._update_export(name, browser)
+            yield
+        if refresh:
+            self._start_background_refresh([name])
+
+    def _refresh_export(self, name, browser):
+        """Download an export to the cache if it has expired."""
+        with self._updated_export(name, browser):
+            pass
+
+    # Version of the pre-parsed snapshot format.  Increment it whenever
+    # the parsing or cleaning of exports changes.
+    _SNAPSHOT_VERSION = 2
+
+    # csv.DictReader arguments used to read an export.  The header of
+    # the product_options export has 47 fields, but each data record
+    # has 48 fields.  By setting restkey to "Extra", we prevent the
+    # extra field from having a key of None.
+    _EXPORT_READER_ARGS = {
+        "product_options": {"restkey": "Extra"}
+    }
+
+    def _make_export_key(self, name, data, reader_args):
+        """
+        Return the snapshot key of an export: the size, mtime, and hash
+        of the CSV file data, and how it is parsed.
+        """
+        stat = os.stat(self._export_filename(name))
+        return (
+            self._SNAPSHOT_VERSION,
+            self._clean,
+            sorted(reader_args.items()),
+            stat.st_size,
+            stat.st_mtime,
+            hashlib.md5(data).hexdigest()
+        )
+
+    def _read_export(self, name, clean_rows, derive=None, **reader_args):
+        """
+        Read a cached export as a list of dictionaries, cleaning the
+        rows if requested.  The result is also saved as a pre-parsed
+        snapshot that is used instead of parsing and cleaning the CSV
+        file again as long as the CSV file does not change.  The
+        caller must hold the export lock.
+
+        If derive is specified, it is called with the rows to build
+        tables derived from them.  The derived tables are saved in the
+        snapshot along with the rows, and (rows, derived) is returned.
+        """
+        filename = self._export_filename(name)
+        snapshot_filename = os.path.join(
+            self._cache_dir,
+            "{}.pickle".format(name)
+        )
+        with open(filename, "rb") as csv_file:
+            data = csv_file.read()
+        key = self._make_export_key(name, data, reader_args)
+
+        # Remember which version of the CSV file the rows came from so
+        # that tables derived from several exports can be keyed by it.
+        self._export_keys[name] = key
+
+        # Use the snapshot if it is current.
+        snapshot = _read_snapshot(
+            snapshot_filename,
+            key,
+            1 if derive is None else 2
+        )
+        if snapshot is not None:
+            rows = snapshot[0]
+            derived = snapshot[1] if derive is not None else None
+        else:
+            # Parse and clean the CSV file.
+            rows = list(
+                csv.DictReader(cStringIO.StringIO(data), **reader_args)
+            )
+            if self._clean:
+                clean_rows(rows)
+            derived = derive(rows) if derive is not None else None
+
+            # Save the rows in the snapshot.
+            _write_snapshot(
+                snapshot_filename,
+                key,
+                [rows] if derive is None else [rows, derived]
+            )
+
+        self._store_in_catalog_db(name, key, rows)
+
+        if derive is not None:
+            return rows, derived
+        return rows
+
+    def prefetch_exports(self, names=None):
+        """
+        Download the named exports (default=all) that have expired.
+        Up to export_concurrency exports are downloaded at the same
+        time, each on its own logged in session.
+        """
+        if names is None:
+            names = self.EXPORTS
+        expired = [name for name in names if self._is_export_expired(name)]
+
+        # Stale exports that are still usable are refreshed in the
+        # background.
+        stale = [
+            name for name in expired if self._is_export_usable_stale(name)
+        ]
+        if len(stale) > 0:
+            self._start_background_refresh(stale)
+            expired = [name for name in expired if name not in stale]
+
+        n_sessions = min(self._export_concurrency, len(expired))
+        if n_sessions <= 1:
+            for name in expired:
+                self._refresh_export(name, self._browser)
+            return
+
+        # Create a pool of sessions that the worker threads check out
+        # for the duration of a single export.
+        sessions = Queue.Queue()
+        sessions.put(self._browser)
+        for slot in range(1, n_sessions):
+            sessions.put(self._new_browser(slot))
+
+        def refresh_export(name):
+            """Download one export using a free session."""
+            browser = sessions.get()
+            try:
+                self._refresh_export(name, browser)
+            finally:
+                sessions.put(browser)
+
+        pool = multiprocessing.pool.ThreadPool(n_sessions)
+        try:
+            pool.map(refresh_export, expired)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _do_export(self, browser, filename):
         """Export a file from CoreCommerce."""
         # This method was derived from the following javascript code
         # returned by pressing the "Export" button.
@@ -229,7 +1088,7 @@ class CCBrowser(object):
                 "&function=processExportCycle"
                 "&current={}"
             ).format(ajax_controller_url, current)
-            response = self._browser.open(url).read()
+            response = browser.open(url).read()
             response_object = json.loads(response)
             if response_object["percentComplete"] == 100:
                 break
@@ -237,14 +1096,11 @@ class CCBrowser(object):
 
         # Fetch the result file.
         url = self._admin_url + "?m=ajax_export_send"
-        self._browser.retrieve(url, filename)
+        browser.retrieve(url, filename)
 
-    def _download_personalizations_csv(self, filename):
+    def _download_personalizations_csv(self, browser, filename):
         """Download personalization list to a CSV file."""
 
-        # Login if necessary.
-        self._login()
-
         # Log time consuming step.
         LOGGER.info("Downloading personalizations")
 
@@ -254,12 +1110,12 @@ class CCBrowser(object):
             "m=ajax_export",
             "&instance=personalization_products&checkAccess=products"
         )
-        self._browser.open(url)
+        self._open(browser, url)
 
         # Call the doExport function.
-        self._do_export(url, filename)
+        self._do_export(browser, filename)
 
-    def _clean_personalizations(self):
+    def _clean_personalizations(self, personalizations):
         """Normalize suspect personalization data."""
         # Boolean value of "" appears to mean "N".
         booleans = [
@@ -270,7 +1126,7 @@ class CCBrowser(object):
             "Required",
             "Track Inventory"
         ]
-        for personalization in self._personalizations:
+        for personalization in personalizations:
             # Booleans should be Y|N, but we sometimes see "".
             for boolean in booleans:
                 if not personalization[boolean] in ("Y", "N"):
@@ -280,28 +1136,19 @@ class CCBrowser(object):
         """Return a list of per-personalization dictionaries."""
 
         if self._personalizations is None:
-            filename = os.path.join(self._cache_dir, "personalizations.csv")
-
-            with lockfile.FileLock(self._download_lock_filename):
-                # Download products file if it is out of date.
-                if self._is_file_expired(filename):
-                    self._download_personalizations_csv(filename)
+            with self._updated_export("personalizations", self._browser):
 
                 # Read personalizations file.
-                self._personalizations = list(csv.DictReader(open(filename)))
-
-                # Cleanup suspect data.
-                if self._clean:
-                    self._clean_personalizations()
+                self._personalizations = self._read_export(
+                    "personalizations",
+                    self._clean_personalizations
+                )
 
         return self._personalizations
 
-    def _download_product_options_csv(self, filename):
+    def _download_product_options_csv(self, browser, filename):
         """Download product_option list to a CSV file."""
 
-        # Login if necessary.
-        self._login()
-
         # Log time consuming step.
         LOGGER.info("Downloading product_options")
 
@@ -311,15 +1158,18 @@ class CCBrowser(object):
             "m=ajax_export",
             "&instance=product_options&checkAccess=products"
         )
-        self._browser.open(url)
+        self._open(browser, url)
 
         # Call the doExport function.
-        self._do_export(url, filename)
+        self._do_export(browser, filename + ".tmp")
+
+        # Repair the duplicate keys in the header.
+        repair_product_options_csv(filename, filename + ".tmp")
 
-    def _clean_product_options(self):
+    def _clean_product_options(self, product_options):
         """Normalize suspect product_option data."""
         # Boolean value of "" appears to mean "N".
-        for product_option in self._product_options:
+        for product_option in product_options:
             # Booleans should be Y|N, but we sometimes see "".
             for key, value in product_option.items():
                 if key and key.startswith("Use First Option Value"):
@@ -330,59 +1180,118 @@ class CCBrowser(object):
         """Return a list of per-product_option dictionaries."""
 
         if self._product_options is None:
-            filename = os.path.join(self._cache_dir, "product_options.csv")
-
-            with lockfile.FileLock(self._download_lock_filename):
-                # Download products file if it is out of date.
-                if self._is_file_expired(filename):
-                    self._download_product_options_csv(filename + ".tmp")
-                    repair_product_options_csv(filename, filename + ".tmp")
-
-                # Read product_options file.
-                # The header has 47 fields, but each data record has
-                # 48 fields.  By setting restkey to "Extra", we
-                # prevent the extra field from having a key of None.
-                self._product_options = list(
-                    csv.DictReader(open(filename), restkey="Extra")
+            with self._updated_export("product_options", self._browser):
+
+                # Read product_options file and the option sets, option
+                # groups, and options derived from it.
+                self._product_options, (
+                    self._option_sets,
+                    self._option_groups,
+                    self._options
+                ) = self._read_export(
+                    "product_options",
+                    self._clean_product_options,
+                    derive=self._derive_option_tables,
+                    **self._EXPORT_READER_ARGS["product_options"]
                 )
 
-                # Cleanup suspect data.
-                if self._clean:
-                    self._clean_product_options()
-
         return self._product_options
 
-    def get_option_sets(self):
+    def _derive_option_tables(self, product_options):
         """
-        Return a list of option sets.  The list is derived from the
-        product options list.
+        Derive the option sets, option groups, and options from the
+        product options list in a single pass.  Return a tuple of the
+        three lists.
         """
+        # pylint: disable=R0201,R0914
 
-        if self._option_sets is None:
-            # Product option values that belong in the option set.
-            copy_keys = (
-                "Product SKU",
-                "Product Id",
-                "Product Name"
-            )
+        # Product option values that belong in the option set.
+        copy_option_set_keys = (
+            "Product SKU",
+            "Product Id",
+            "Product Name"
+        )
+        # Product option values that belong in the option group.
+        copy_option_group_keys = (
+            "Option Group Name",
+            "First Option Value",
+            "Use First Option Value"
+        )
+        # Product option values that belong in the option.
+        copy_option_keys = (
+            "Option Group Id",
+            "Option Group Name",
+            "Option Name",
+            "Option Sort"
+        )
 
-            # Process product options sorted by product, option set sku.
-            product_options = sorted(
-                self.get_product_options(),
-                key=lambda product_option: (
-                    product_option["Product Id"],
-                    product_option["Option Set SKU"]
-                )
+        # Process product options sorted by product, option set sku.
+        product_options = sorted(
+            product_options,
+            key=lambda product_option: (
+                product_option["Product Id"],
+                product_option["Option Set SKU"]
             )
+        )
 
-            self._option_sets = []
-            for product_option in product_options:
-                option_set = {}
-                for key, value in product_option.items():
-                    if key in copy_keys or key.startswith("Option Set "):
-                        option_set[key] = value
-                self._option_sets.append(option_set)
+        option_sets = []
+        option_groups = []
+        options = []
+        option_group_ids = set()
+        option_ids = set()
+        for product_option in product_options:
+            option_set = {}
+            for key, value in product_option.items():
+                if (
+                    key in copy_option_set_keys or
+                    key.startswith("Option Set ")
+                ):
+                    option_set[key] = value
+            option_sets.append(option_set)
+
+            for idx in range(1, 10):
+                group_id_key = "Option Group Id [{}]".format(idx)
+                if group_id_key not in product_option:
+                    break
+                option_group_id = product_option[group_id_key]
+                if option_group_id in option_group_ids:
+                    continue
+                option_group_ids.add(option_group_id)
+                option_group = {}
+                option_group["Option Group Id"] = option_group_id
+                for key in copy_option_set_keys:
+                    option_group[key] = product_option[key]
+                for key in copy_option_group_keys:
+                    product_option_key = "{} [{}]".format(key, idx)
+                    option_group[key] = product_option[product_option_key]
+                option_groups.append(option_group)
+
+            for idx in range(1, 10):
+                option_id_key = "Option Id [{}]".format(idx)
+                if option_id_key not in product_option:
+                    break
+                option_id = product_option[option_id_key]
+                if option_id in option_ids:
+                    continue
+                option_ids.add(option_id)
+                option = {}
+                option["Option Id"] = option_id
+                for key in copy_option_set_keys:
+                    option[key] = product_option[key]
+                for key in copy_option_keys:
+                    product_option_key = "{} [{}]".format(key, idx)
+                    option[key] = product_option[product_option_key]
+                options.append(option)
+
+        return option_sets, option_groups, options
 
+    def get_option_sets(self):
+        """
+        Return a list of option sets.  The list is derived from the
+        product options list.
+        """
+        if self._option_sets is None:
+            self.get_product_options()
         return self._option_sets
 
     def get_option_groups(self):
@@ -390,49 +1299,8 @@ class CCBrowser(object):
         Return a list of option groups.  The list is derived from the
         product options list.
         """
-
         if self._option_groups is None:
-            # Product option values that belong in the option group.
-            copy_option_set_keys = (
-                "Product SKU",
-                "Product Id",
-                "Product Name",
-            )
-            copy_option_group_keys = (
-                "Option Group Name",
-                "First Option Value",
-                "Use First Option Value"
-            )
-
-            # Process product options sorted by product, option group sku.
-            product_options = sorted(
-                self.get_product_options(),
-                key=lambda product_option: (
-                    product_option["Product Id"],
-                    product_option["Option Set SKU"]
-                )
-            )
-
-            option_group_ids = []
-            self._option_groups = []
-            for product_option in product_options:
-                for idx in range(1, 10):
-                    group_id_key = "Option Group Id [{}]".format(idx)
-                    if group_id_key not in product_option:
-                        break
-                    option_group_id = product_option[group_id_key]
-                    if option_group_id in option_group_ids:
-                        continue
-                    option_group_ids.append(option_group_id)
-                    option_group = {}
-                    option_group["Option Group Id"] = option_group_id
-                    for key in copy_option_set_keys:
-                        option_group[key] = product_option[key]
-                    for key in copy_option_group_keys:
-                        product_option_key = "{} [{}]".format(key, idx)
-                        option_group[key] = product_option[product_option_key]
-                    self._option_groups.append(option_group)
-
+            self.get_product_options()
         return self._option_groups
 
     def get_options(self):
@@ -440,57 +1308,13 @@ class CCBrowser(object):
         Return a list of options.  The list is derived from the product
         options list.
         """
-
         if self._options is None:
-            # Product option values that belong in the option group.
-            copy_option_set_keys = (
-                "Product SKU",
-                "Product Id",
-                "Product Name",
-            )
-            copy_option_group_keys = (
-                "Option Group Id",
-                "Option Group Name"
-            )
-            copy_option_keys = (
-                "Option Name",
-                "Option Sort"
-            )
-
-            # Process product options sorted by product, option group sku.
-            product_options = sorted(
-                self.get_product_options(),
-                key=lambda product_option: (
-                    product_option["Product Id"],
-                    product_option["Option Set SKU"]
-                )
-            )
-
-            option_ids = []
-            self._options = []
-            for product_option in product_options:
-                for idx in range(1, 10):
-                    option_id_key = "Option Id [{}]".format(idx)
-                    if option_id_key not in product_option:
-                        break
-                    option_id = product_option[option_id_key]
-                    if option_id in option_ids:
-                        continue
-                    option_ids.append(option_id)
-                    option = {}
-                    option["Option Id"] = option_id
-                    for key in copy_option_set_keys:
-                        option[key] = product_option[key]
-                    for key in copy_option_group_keys:
-                        product_option_key = "{} [{}]".format(key, idx)
-                        option[key] = product_option[product_option_key]
-                    for key in copy_option_keys:
-                        product_option_key = "{} [{}]".format(key, idx)
-                        option[key] = product_option[product_option_key]
-                    self._options.append(option)
-
+            self.get_product_options()
         return self._options
 
+    # Exports that the variants are derived from.
+    _VARIANT_EXPORTS = ("products", "personalizations", "product_options")
+
     def get_variants(self):
         """Return a list of per-variant dictionaries."""
 
@@ -562,23 +1386,29 @@ class CCBrowser(object):
                 "Option Set Notify Level"
             )
 
-            # Get source lists.
+            # Get source lists.  Group the personalizations and product
+            # options by product in one pass so that finding those of a
+            # product is a dictionary lookup rather than a scan.
             products = self.get_products()
-            personalizations = self.get_personalizations()
-            product_options = self.get_product_options()
+            personalizations_by_product = group_by(
+                self.get_personalizations(),
+                "Product Name",
+                "Product SKU"
+            )
+            product_options_by_product = group_by(
+                self.get_product_options(),
+                "Product Name",
+                "Product SKU"
+            )
 
             for product in products:
-                product_name = product["Product Name"]
-                product_sku = product["SKU"]
+                product_key = (product["Product Name"], product["SKU"])
 
                 # Convert personalizations to variants.
-                relevant_personalizations = [
-                    personalization for personalization in personalizations
-                    if (
-                        personalization["Product Name"] == product_name and
-                        personalization["Product SKU"] == product_sku
-                    )
-                ]
+                relevant_personalizations = personalizations_by_product.get(
+                    product_key,
+                    []
+                )
                 if len(relevant_personalizations) > 0:
                     for personalization in relevant_personalizations:
                         variant = {
@@ -604,13 +1434,10 @@ class CCBrowser(object):
                         self._variants.append(variant)
 
                 # Convert option sets to variants.
-                relevant_product_options = [
-                    product_option for product_option in product_options
-                    if (
-                        product_option["Product Name"] == product_name and
-                        product_option["Product SKU"] == product_sku
-                    )
-                ]
+                relevant_product_options = product_options_by_product.get(
+                    product_key,
+                    []
+                )
                 if len(relevant_product_options) > 0:
                     for product_option in relevant_product_options:
                         variant = {
@@ -651,8 +1478,240 @@ class CCBrowser(object):
                         variant["Variant Enabled"] = "Y"
                         self._variants.append(variant)
 
+            self._store_in_catalog_db(
+                "variants",
+                [self._export_keys[name] for name in self._VARIANT_EXPORTS],
+                self._variants
+            )
+
         return self._variants
 
+    def get_variants_for_product(self, product):
+        """
+        Return the list of variants of a product dictionary, in the
+        order returned by get_variants().
+        """
+        return self.query(
+            "variants",
+            {
+                "Product Name": product["Product Name"],
+                "Product SKU": product["SKU"]
+            }
+        )
+
+    def get_variants_by_product_sku(self, sku):
+        """
+        Return the list of variants of all products with the given SKU,
+        in the order returned by get_variants().
+        """
+        return self.query("variants", {"Product SKU": sku})
+
+    def iter_inventory(self, products=None, track_by=None):
+        """
+        Generate an inventory row for each product in products
+        (default=get_products()) whose inventory is tracked "By
+        Product", and for each variant of the other products.  The
+        variants of a product are sorted by variant_key().  If track_by
+        is "By Product" or "By Variant", it is used instead of the
+        "Track Inventory" of every product.
+
+        Each row is a dictionary with "SKU" (the product SKU, or the
+        product and variant SKUs joined by "-"), "Name", "Inventory
+        Level", "Enabled", "Main Photo", "Product" (the product
+        dictionary), and "Variant" (the variant dictionary, or None).
+
+        The variants are grouped by Product SKU in a single pass (see
+        get_index()), so the time taken is linear in the number of
+        products and variants.
+        """
+        if products is None:
+            products = self.get_products()
+        for product in products:
+            product_sku = product["SKU"]
+            product_name = product["Product Name"]
+            if (track_by or product["Track Inventory"]) == "By Product":
+                yield {
+                    "SKU": product_sku,
+                    "Name": product_name,
+                    "Inventory Level": product["Inventory Level"],
+                    "Enabled": product["Available"],
+                    "Main Photo": product["Main Photo (Image)"],
+                    "Product": product,
+                    "Variant": None
+                }
+                continue
+            variants = sorted(
+                self.get_variants_by_product_sku(product_sku),
+                key=self.variant_key
+            )
+            for variant in variants:
+                variant_sku = variant["Variant SKU"]
+                if variant_sku == "":
+                    sku = product_sku
+                else:
+                    sku = "{}-{}".format(product_sku, variant_sku)
+                yield {
+                    "SKU": sku,
+                    "Name": "{} ({})".format(
+                        product_name,
+                        variant["Variant Name"]
+                    ),
+                    "Inventory Level": variant["Variant Inventory Level"],
+                    "Enabled": variant["Variant Enabled"],
+                    "Main Photo": variant["Variant Main Photo (Image)"],
+                    "Product": product,
+                    "Variant": variant
+                }
+
+    # Product fields added by add_product_inventory_rollups().
+    PRODUCT_ROLLUP_FIELDS = (
+        "Personalization Inventory Level",
+        "Option Sets Inventory Level",
+        "Variant Inventory Level",
+        "Tracked Inventory Level"
+    )
+
+    # Category fields added by add_category_inventory_rollups().
+    CATEGORY_ROLLUP_FIELDS = ("Inventory Level",)
+
+    # Exports that the inventory roll-ups are derived from.
+    _ROLLUP_EXPORTS = ("products", "personalizations", "product_options")
+
+    # Version of the inventory roll-up snapshot format.  Increment it
+    # whenever the roll-up calculations change.
+    _ROLLUP_VERSION = 1
+
+    def _calc_inventory_rollups(self):
+        """
+        Calculate the inventory roll-ups in a single pass over the
+        products and their variants.  Return a dictionary that maps
+        (Product Name, SKU) to the product roll-up fields and a
+        dictionary that maps each category name to the category
+        roll-up fields.
+        """
+        variants_by_product = self.get_index(
+            "variants",
+            "Product Name",
+            "Product SKU"
+        )
+        product_rollups = dict()
+        category_totals = dict()
+        for product in self.get_products():
+            product_key = (product["Product Name"], product["SKU"])
+            variants = variants_by_product.get(product_key, [])
+            personalization_total = total_inventory_levels(
+                variant["Variant Inventory Level"] for variant in variants
+                if variant["Variant Type"] == "Personalization"
+            )
+            option_set_total = total_inventory_levels(
+                variant["Variant Inventory Level"] for variant in variants
+                if variant["Variant Type"] == "Option"
+            )
+            variant_total = (
+                personalization_total[0] + option_set_total[0],
+                personalization_total[1] or option_set_total[1]
+            )
+            if product["Track Inventory"] == "By Product":
+                tracked_total = total_inventory_levels(
+                    [product["Inventory Level"]]
+                )
+            else:
+                tracked_total = variant_total
+            product_rollups[product_key] = {
+                "Personalization Inventory Level":
+                    format_inventory_total(*personalization_total),
+                "Option Sets Inventory Level":
+                    format_inventory_total(*option_set_total),
+                "Variant Inventory Level":
+                    format_inventory_total(*variant_total),
+                "Tracked Inventory Level":
+                    format_inventory_total(*tracked_total)
+            }
+
+            # The inventory of a category is the total of the tracked
+            # inventory of its products.
+            total, err = category_totals.get(product["Category"], (0, False))
+            category_totals[product["Category"]] = (
+                total + tracked_total[0],
+                err or tracked_total[1]
+            )
+
+        category_rollups = dict(
+            (
+                category_name,
+                {"Inventory Level": format_inventory_total(total, err)}
+            )
+            for category_name, (total, err) in category_totals.items()
+        )
+        return product_rollups, category_rollups
+
+    def _get_inventory_rollups(self):
+        """
+        Return the product and category roll-ups (see
+        _calc_inventory_rollups()).  They are calculated once per
+        snapshot of the exports that they are derived from, and saved
+        in the cache so that later runs do not have to load the
+        variants.
+        """
+        if self._inventory_rollups is not None:
+            return self._inventory_rollups
+
+        # The roll-ups are keyed by the snapshot keys of the exports
+        # as they were loaded, so that they always match the loaded
+        # products even if an export is refreshed in the background.
+        key = [self._ROLLUP_VERSION]
+        for name in self._ROLLUP_EXPORTS:
+            getattr(self, "get_{}".format(name))()
+            key.append((name, self._export_keys[name]))
+        snapshot_filename = os.path.join(
+            self._cache_dir,
+            "inventory_rollups.pickle"
+        )
+        snapshot = _read_snapshot(snapshot_filename, key, 1)
+        if snapshot is not None:
+            self._inventory_rollups = snapshot[0]
+            return self._inventory_rollups
+
+        self._inventory_rollups = self._calc_inventory_rollups()
+        _write_snapshot(snapshot_filename, key, [self._inventory_rollups])
+        return self._inventory_rollups
+
+    def add_product_inventory_rollups(self):
+        """
+        Add the PRODUCT_ROLLUP_FIELDS to each product dictionary.  The
+        totals include the inventory levels of both the personalization
+        and the option set variants of a product.  "Tracked Inventory
+        Level" is the product inventory level if the product is
+        tracked "By Product", and the variant total otherwise.  A total
+        is prefixed with "(err) " if any of its levels is not a number
+        or is negative.
+        """
+        if not self._product_rollups_added:
+            product_rollups = self._get_inventory_rollups()[0]
+            for product in self.get_products():
+                product.update(
+                    product_rollups[(product["Product Name"], product["SKU"])]
+                )
+            self._product_rollups_added = True
+
+    def add_category_inventory_rollups(self):
+        """
+        Add the CATEGORY_ROLLUP_FIELDS to each category dictionary.
+        "Inventory Level" is the total of the "Tracked Inventory Level"
+        of the products in the category (see
+        add_product_inventory_rollups()).
+        """
+        if not self._category_rollups_added:
+            category_rollups = self._get_inventory_rollups()[1]
+            for category in self.get_categories():
+                category.update(
+                    category_rollups.get(
+                        category["Category Name"],
+                        {"Inventory Level": format_inventory_total(0, False)}
+                    )
+                )
+            self._category_rollups_added = True
+
     def get_questions(self):
         """
         Return a list of per-question dictionaries.  The list is derived
@@ -712,12 +1771,9 @@ class CCBrowser(object):
 
         return self._questions
 
-    def _download_products_csv(self, filename):
+    def _download_products_csv(self, browser, filename):
         """Download products list to a CSV file."""
 
-        # Login if necessary.
-        self._login()
-
         # Log time consuming step.
         LOGGER.info("Downloading products")
 
@@ -726,13 +1782,13 @@ class CCBrowser(object):
             self._admin_url +
             "?m=ajax_export&instance=products&checkAccess=products"
         )
-        self._browser.open(url)
+        self._open(browser, url)
 
         # Select form.
-        self._select_form("jsform")
+        self._select_form(browser, "jsform")
 
         # Ensure that "All Categories" is selected.
-        category_list = self._browser.form.find_control("category")
+        category_list = browser.form.find_control("category")
         if False:  # debug
             for item in category_list.items:
                 print(
@@ -744,16 +1800,16 @@ class CCBrowser(object):
         category_list.value = [""]  # name where values = ["All Categories"]
 
         # Submit the form (press the "Export" button).
-        resp = self._browser.submit()
+        resp = browser.submit()
         if False:  # debug
             # Examine the source of the doExport method.
             print("Response from {}:\n".format(url))
             print(resp.read().replace("\r", ""))
 
         # Call the doExport function.
-        self._do_export(url, filename)
+        self._do_export(browser, filename)
 
-    def _clean_products(self):
+    def _clean_products(self, products):
         """Normalize suspect product data."""
         # Boolean value of "" appears to mean "N".
         booleans = [
@@ -778,7 +1834,7 @@ class CCBrowser(object):
             "Use Sale Price",
             "Use Tab Navigation"
         ]
-        for product in self._products:
+        for product in products:
             # Booleans should be Y|N, but we sometimes see "".
             for boolean in booleans:
                 if not product[boolean] in ("Y", "N"):
@@ -788,19 +1844,13 @@ class CCBrowser(object):
         """Return a list of per-product dictionaries."""
 
         if self._products is None:
-            filename = os.path.join(self._cache_dir, "products.csv")
-
-            with lockfile.FileLock(self._download_lock_filename):
-                # Download products file if it is out of date.
-                if self._is_file_expired(filename):
-                    self._download_products_csv(filename)
+            with self._updated_export("products", self._browser):
 
                 # Read products file.
-                self._products = list(csv.DictReader(open(filename)))
-
-                # Cleanup suspect data.
-                if self._clean:
-                    self._clean_products()
+                self._products = self._read_export(
+                    "products",
+                    self._clean_products
+                )
 
         return self._products
 
@@ -808,6 +1858,16 @@ class CCBrowser(object):
         "Price": "pPrice"
     }
 
+    def get_product_by_sku(self, sku):
+        """Return the first product with the given SKU, or None."""
+        products = self.query("products", {"SKU": sku})
+        return products[0] if products else None
+
+    def get_product_by_name_sku(self, name, sku):
+        """Return the first product with the given name and SKU, or None."""
+        products = self.query("products", {"Product Name": name, "SKU": sku})
+        return products[0] if products else None
+
     def is_valid_product_update_key(self, key):
         """Return True if key is a valid product update key."""
         return key in self._PRODUCT_KEY_MAP
@@ -819,9 +1879,6 @@ class CCBrowser(object):
     def update_product(self, sku, key, value):
         """Login to site."""
 
-        # Login if necessary.
-        self._login()
-
         # Log time consuming step.
         LOGGER.info(
             "Updating product SKU={}, setting {} to {}".format(
@@ -831,8 +1888,9 @@ class CCBrowser(object):
             )
         )
 
-        # Open the upload page.
-        self._browser.open(
+        # Open the upload page, logging in if necessary.
+        self._open(
+            self._browser,
             self._admin_url + "?m=ajax_import&instance=product_import"
         )
         for form in self._browser.forms():
@@ -923,12 +1981,9 @@ class CCBrowser(object):
         #   fields[1]:   pPrice
         #   ignore:      Y
 
-    def _download_categories_csv(self, filename):
+    def _download_categories_csv(self, browser, filename):
         """Download categories list to a CSV file."""
 
-        # Login if necessary.
-        self._login()
-
         # Log time consuming step.
         LOGGER.info("Downloading categories")
 
@@ -937,15 +1992,15 @@ class CCBrowser(object):
             self._admin_url +
             "?m=ajax_export&instance=categories&checkAccess=categories"
         )
-        self._browser.open(url)
+        self._open(browser, url)
 
         # Call the doExport function.
-        self._do_export(url, filename)
+        self._do_export(browser, filename)
 
-    def _clean_categories(self):
+    def _clean_categories(self, categories):
         """Normalize suspect product data."""
         # Boolean value of "" appears to mean "N".
-        for product in self._categories:
+        for product in categories:
             if not product["Hide This Category From Customers"] in ("Y", "N"):
                 product["Available"] = "N"
 
@@ -953,19 +2008,13 @@ class CCBrowser(object):
         """Return a list of per-category dictionaries."""
 
         if self._categories is None:
-            filename = os.path.join(self._cache_dir, "categories.csv")
-
-            with lockfile.FileLock(self._download_lock_filename):
-                # Download categories file if it is out of date.
-                if self._is_file_expired(filename):
-                    self._download_categories_csv(filename)
+            with self._updated_export("categories", self._browser):
 
                 # Read categories file.
-                self._categories = list(csv.DictReader(open(filename)))
-
-                # Cleanup suspect data.
-                if self._clean:
-                    self._clean_categories()
+                self._categories = self._read_export(
+                    "categories",
+                    self._clean_categories
+                )
 
         return self._categories
 
@@ -1036,24 +2085,22 @@ class CCBrowser(object):
         """
         if self._category_sort is None:
             self._init_category_sort()
-        self.get_products()
 
-        category = None
+        category_sort_key = None
         product_sort_key = None
-        for product in self._products:
-            if (
-                product["Product Name"] == personalization["Product Name"] and
-                product["SKU"] == personalization["Product SKU"]
-            ):
-                category = product["Category"]
-                if category in self._category_sort:
-                    category_sort_key = "{:05d}".format(
-                        self._category_sort[category]
-                    )
-                else:
-                    category_sort_key = category
-                product_sort_key = product["Product Name"]
-                break
+        product = self.get_product_by_name_sku(
+            personalization["Product Name"],
+            personalization["Product SKU"]
+        )
+        if product is not None:
+            category = product["Category"]
+            if category in self._category_sort:
+                category_sort_key = "{:05d}".format(
+                    self._category_sort[category]
+                )
+            else:
+                category_sort_key = category
+            product_sort_key = product["Product Name"]
 
         return (
             category_sort_key,
@@ -1077,24 +2124,22 @@ class CCBrowser(object):
         """
         if self._category_sort is None:
             self._init_category_sort()
-        self.get_products()
 
-        category = None
+        category_sort_key = None
         product_sort_key = None
-        for product in self._products:
-            if (
-                product["Product Name"] == product_option["Product Name"] and
-                product["SKU"] == product_option["Product SKU"]
-            ):
-                category = product["Category"]
-                if category in self._category_sort:
-                    category_sort_key = "{:05d}".format(
-                        self._category_sort[category]
-                    )
-                else:
-                    category_sort_key = category
-                product_sort_key = product["Product Name"]
-                break
+        product = self.get_product_by_name_sku(
+            product_option["Product Name"],
+            product_option["Product SKU"]
+        )
+        if product is not None:
+            category = product["Category"]
+            if category in self._category_sort:
+                category_sort_key = "{:05d}".format(
+                    self._category_sort[category]
+                )
+            else:
+                category_sort_key = category
+            product_sort_key = product["Product Name"]
 
         return (
             category_sort_key,
@@ -1150,9 +2195,8 @@ class CCBrowser(object):
         IDs.  Guess the ones we can.
         """
 
-        # Download products and personalizations.
+        # Download products.
         self.get_products()
-        self.get_personalizations()
 
         # Guess an ID for each product.
         for product in self._products:
@@ -1164,20 +2208,43 @@ class CCBrowser(object):
 
             # Find a personalization that matches in name and SKU.
             product_id = ""
-            name = product["Product Name"]
-            sku = product["SKU"]
-            for personalization in self._personalizations:
-                if (
-                    personalization["Product Name"] == name and
-                    personalization["Product SKU"] == sku
-                ):
-                    product_id = personalization["Product Id"]
-                    break
+            matches = self.query(
+                "personalizations",
+                {
+                    "Product Name": product["Product Name"],
+                    "Product SKU": product["SKU"]
+                }
+            )
+            if matches:
+                product_id = matches[0]["Product Id"]
 
             # Assign the guessed ID to the product.
             product["Product Id"] = product_id
 
 
+def _revalidate_main():
+    """
+    Download expired exports with a blocking CCBrowser.  This is run in
+    a background process by CCBrowser._start_background_refresh(),
+    which writes the CCBrowser arguments and the export names as JSON
+    to stdin.
+    """
+    if hasattr(os, "setsid"):
+        # Detach from the terminal.  This fails if the process is
+        # already a process group leader, which is harmless.
+        try:
+            os.setsid()
+        except OSError:
+            pass
+    options = dict()
+    for key, value in json.load(sys.stdin).items():
+        if isinstance(value, unicode):
+            value = value.encode("utf-8")
+        options[str(key)] = value
+    names = [str(name) for name in options.pop("names")]
+    CCBrowser(**options).prefetch_exports(names)
+
+
 _HTML_TO_PLAIN_TEXT_DICT = {
     "&quot;": "\"",
     "&amp;": "&",
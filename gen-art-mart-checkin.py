@@ -364,7 +364,8 @@ def main():
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
     # Fetch products list.
@@ -66,14 +66,14 @@ def generate_xlsx(args, cc_browser, products):
     workbook.save(args.xlsx_filename)
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
     )
     now = datetime.datetime.now()
-    default_xlsx_filename = now.strftime("%Y-%m-%d-PurchaseOrder.xlsx")
+    default_xlsx_filename = now.strftime("%Y-%m-%d-FedExProductDict.xlsx")
 
     arg_parser = argparse.ArgumentParser(
         description="Generates a FedEx Product Dictionary."
@@ -108,8 +108,31 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the product dictionary."""
+    # Fetch products list.
+    products = cc_browser.get_products()
+
+    # Generate spreadsheet.
+    logging.getLogger().debug(
+        "Generating {}".format(os.path.abspath(args.xlsx_filename))
+    )
+    generate_xlsx(args, cc_browser, products)
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -126,22 +149,18 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.RawConfigParser()
-    config.readfp(open(args.config))
+    config = read_config(args)
 
     # Create a connection to CoreCommerce.
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
-    # Fetch products list.
-    products = cc_browser.get_products()
-
-    # Generate spreadsheet.
-    logger.debug("Generating {}".format(os.path.abspath(args.xlsx_filename)))
-    generate_xlsx(args, cc_browser, products)
+    # Generate the product dictionary.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
@@ -14,6 +14,7 @@ import openpyxl  # sudo pip install openpyxl
 import notify_send_handler
 
 import cctools
+import inventory_history
 
 
 def set_cell(
@@ -80,16 +81,9 @@ def generate_xlsx(args, inventory):
     workbook.save(args.xlsx_filename)
 
 
-def fetch_inventory(args, config):
+def fetch_inventory(args, cc_browser):
     """Fetch inventory data from CoreCommerce."""
 
-    # Create a connection to CoreCommerce.
-    cc_browser = cctools.CCBrowser(
-        config.get("website", "base_url"),
-        config.get("website", "username"),
-        config.get("website", "password")
-    )
-
     # Get list of products.
     products = cc_browser.get_products()
 
@@ -100,55 +94,26 @@ def fetch_inventory(args, config):
         key = cc_browser.product_key_by_cat_and_name
     products = sorted(products, key=key)
 
-    # Get list of variants.
-    variants = cc_browser.get_variants()
-    variants = sorted(variants, key=cc_browser.variant_key)
-
-    inventory = list()
-    for product in products:
-        if product["Available"] == "N":
-            continue
-        product_sku = product["SKU"]
-        product_name = product["Product Name"]
-        product_level = product["Inventory Level"]
-        if product["Track Inventory"] == "By Product":
-            enabled = product["Available"]
-            main_photo = product["Main Photo (Image)"]
-            inventory.append(
-                (product_sku, product_level, product_name, enabled, main_photo)
-            )
-        else:
-            for variant in variants:
-                if product_sku == variant["Product SKU"]:
-                    variant_sku = variant["Variant SKU"]
-                    if variant_sku == "":
-                        sku = product_sku
-                    else:
-                        sku = "{}-{}".format(product_sku, variant_sku)
-                    variant_inventory_level = variant[
-                        "Variant Inventory Level"
-                    ]
-                    answer = variant["Variant Name"]
-                    name = "{} ({})".format(product_name, answer)
-                    enabled = variant["Variant Enabled"]
-                    main_photo = variant["Variant Main Photo (Image)"]
-                    inventory.append(
-                        (
-                            sku,
-                            variant_inventory_level,
-                            name,
-                            enabled,
-                            main_photo
-                        )
-                    )
+    inventory = [
+        (
+            row["SKU"],
+            row["Inventory Level"],
+            row["Name"],
+            row["Enabled"],
+            row["Main Photo"]
+        )
+        for row in cc_browser.iter_inventory(
+            product for product in products if product["Available"] != "N"
+        )
+    ]
 
     # for sku, level, name in inventory:
     #     print("{:9} {:4} {}".format(sku, level, name))
     return inventory
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
@@ -186,8 +151,34 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the inventory spreadsheet."""
+    # pylint: disable=unused-argument
+
+    # Get inventory info.
+    inventory = fetch_inventory(args, cc_browser)
+
+    # Add the inventory levels to the inventory history.
+    inventory_history.record_snapshot(cc_browser)
+
+    # Create spreadsheet.
+    logging.getLogger().debug("Generating %s", args.xlsx_filename)
+    generate_xlsx(args, inventory)
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -204,15 +195,18 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.RawConfigParser()
-    config.readfp(open(args.config))
+    config = read_config(args)
 
-    # Get inventory info.
-    inventory = fetch_inventory(args, config)
+    # Create a connection to CoreCommerce.
+    cc_browser = cctools.CCBrowser(
+        config.get("website", "base_url"),
+        config.get("website", "username"),
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
+    )
 
-    # Create spreadsheet.
-    logger.debug("Generating %s", args.xlsx_filename)
-    generate_xlsx(args, inventory)
+    # Generate the inventory spreadsheet.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
@@ -11,10 +11,11 @@ import itertools
 import logging
 import os
 
-import openpyxl  # sudo pip install openpyxl
 import notify_send_handler
 
 import cctools
+import inventory_history
+import xlsx_writer
 
 
 def set_cell(
@@ -25,15 +26,21 @@ def set_cell(
     font_bold=False,
     font_size=11,
     alignment_horizontal="general",
-    alignment_vertical="bottom"
+    alignment_vertical="bottom",
+    number_format="General"
 ):
     """Set cell value and style."""
-    cell = worksheet.cell(row=row, column=col)
-    cell.value = value
-    cell.font = openpyxl.styles.Font(bold=font_bold, size=font_size)
-    cell.alignment = openpyxl.styles.Alignment(
-        horizontal=alignment_horizontal,
-        vertical=alignment_vertical
+    worksheet.set_cell(
+        row,
+        col,
+        value,
+        worksheet.parent.get_style_name(
+            font_bold=font_bold,
+            font_size=font_size,
+            alignment_horizontal=alignment_horizontal,
+            alignment_vertical=alignment_vertical,
+            number_format=number_format
+        )
     )
 
 
@@ -45,6 +52,9 @@ def col_letter(col):
 def add_inventory_to_worksheet(args, inventory, worksheet):
     """Add inventory to a worksheet."""
 
+    # Freeze the first four columns.
+    worksheet.freeze_panes = "E1"
+
     # Create header row.
     row = 3
     col = 1
@@ -107,10 +117,9 @@ def add_inventory_to_worksheet(args, inventory, worksheet):
             col,
             "Change",
             font_bold=True,
-            alignment_horizontal="right"
+            alignment_horizontal="right",
+            number_format="yyyy-mm-dd"
         )
-        cell = worksheet.cell(row=row, column=col)
-        cell.number_format = "yyyy-mm-dd"
         col += 1
 
     # Create data rows.
@@ -129,25 +138,18 @@ def add_inventory_to_worksheet(args, inventory, worksheet):
         set_cell(worksheet, row, col, current)
         col += 1
         set_cell(worksheet, row, col, int(level))
-
-    # Freeze the first four columns.
-    worksheet.freeze_panes = "E1"
+        worksheet.flush(row + 1)
 
 
 def generate_xlsx(args, inventory):
     """Generate the XLS file."""
 
     # Construct a document.
-    workbook = openpyxl.workbook.Workbook()
+    workbook = xlsx_writer.StreamingWorkbook()
 
     # Create and fill in a tab for each category.
-    for index, (category, products) in enumerate(inventory):
-        # Get or create worksheet (tab).
-        if index == 0:
-            worksheet = workbook.worksheets[0]
-            worksheet.title = category
-        else:
-            worksheet = workbook.create_sheet(category)
+    for category, products in inventory:
+        worksheet = workbook.create_sheet(category)
 
         # Add the products to the worksheet.
         add_inventory_to_worksheet(args, products, worksheet)
@@ -156,81 +158,36 @@ def generate_xlsx(args, inventory):
     workbook.save(args.xlsx_filename)
 
 
-def fetch_inventory(args, config):
+def fetch_inventory(args, cc_browser):
     """Fetch inventory data from CoreCommerce."""
 
-    # Create a connection to CoreCommerce.
-    cc_browser = cctools.CCBrowser(
-        config.get("website", "base_url"),
-        config.get("website", "username"),
-        config.get("website", "password")
-    )
-
     # Get list of products.
     products = cc_browser.get_products()
 
     # Sort products by category, product_name.
     products = sorted(products, key=cc_browser.product_key_by_cat_and_name)
 
-    # Get list of variants.
-    variants = cc_browser.get_variants()
-    variants = sorted(variants, key=cc_browser.variant_key)
-
     # Group products by category.
     inventory = []
     for _, product_group in itertools.groupby(
-        products,
+        (product for product in products if product["Available"] != "N"),
         key=cc_browser.product_key_by_category
     ):
-        # Assemble product data for the product_group.
-        category_products = None
-        for product in product_group:
-            if product["Available"] == "N":
-                continue
-
-            category_name = product["Category"]
-            if category_products is None:
-                category_products = []
-                inventory.append((category_name, category_products))
-
-            product_sku = product["SKU"]
-            product_name = product["Product Name"]
-            product_level = product["Inventory Level"]
-            if product["Track Inventory"] == "By Product":
-                enabled = product["Available"]
-                category_products.append(
-                    (product_sku, product_name, product_level, enabled)
-                )
-            else:
-                for variant in variants:
-                    if product_sku == variant["Product SKU"]:
-                        variant_sku = variant["Variant SKU"]
-                        if variant_sku == "":
-                            sku = product_sku
-                        else:
-                            sku = "{}-{}".format(product_sku, variant_sku)
-                        answer = variant["Variant Name"]
-                        if answer == "Assorted":
-                            continue
-                        name = "{} ({})".format(product_name, answer)
-                        variant_inventory_level = variant[
-                            "Variant Inventory Level"
-                        ]
-                        enabled = variant["Variant Enabled"]
-                        category_products.append(
-                            (
-                                sku,
-                                name,
-                                variant_inventory_level,
-                                enabled
-                            )
-                        )
+        product_group = list(product_group)
+        category_name = product_group[0]["Category"]
+        category_products = [
+            (row["SKU"], row["Name"], row["Inventory Level"], row["Enabled"])
+            for row in cc_browser.iter_inventory(product_group)
+            if row["Variant"] is None or
+            row["Variant"]["Variant Name"] != "Assorted"
+        ]
+        inventory.append((category_name, category_products))
 
     return inventory
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
@@ -268,8 +225,34 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the inventory spreadsheet."""
+    # pylint: disable=unused-argument
+
+    # Get inventory info.
+    inventory = fetch_inventory(args, cc_browser)
+
+    # Add the inventory levels to the inventory history.
+    inventory_history.record_snapshot(cc_browser)
+
+    # Create spreadsheet.
+    logging.getLogger().debug("Generating %s", args.xlsx_filename)
+    generate_xlsx(args, inventory)
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -286,15 +269,18 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.RawConfigParser()
-    config.readfp(open(args.config))
+    config = read_config(args)
 
-    # Get inventory info.
-    inventory = fetch_inventory(args, config)
+    # Create a connection to CoreCommerce.
+    cc_browser = cctools.CCBrowser(
+        config.get("website", "base_url"),
+        config.get("website", "username"),
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
+    )
 
-    # Create spreadsheet.
-    logger.debug("Generating %s", args.xlsx_filename)
-    generate_xlsx(args, inventory)
+    # Generate the inventory spreadsheet.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
@@ -20,6 +20,7 @@ import openpyxl  # sudo pip install openpyxl
 
 import cctools
 import notify_send_handler
+import xlsx_writer
 
 CHECK_FOR_LACK_OF_ANY = False  # until most "Any" variants have been added
 
@@ -51,15 +52,18 @@ def set_cell(
     number_format="General"
 ):
     """Set cell value and style."""
-    cell = worksheet.cell(row=row, column=col)
-    cell.value = value
-    cell.font = openpyxl.styles.Font(bold=font_bold, size=font_size)
-    cell.alignment = openpyxl.styles.Alignment(
-        horizontal=alignment_horizontal,
-        vertical=alignment_vertical
+    worksheet.set_cell(
+        row,
+        col,
+        value,
+        worksheet.parent.get_style_name(
+            font_bold=font_bold,
+            font_size=font_size,
+            alignment_horizontal=alignment_horizontal,
+            alignment_vertical=alignment_vertical,
+            number_format=number_format
+        )
     )
-    if number_format != "General":
-        cell.number_format = number_format
 
 
 def col_letter(col):
@@ -119,8 +123,7 @@ def set_label_value(
         col_value = col_value_start
     else:
         col_value = col_value_end
-    cell = worksheet.cell(row=row, column=col_value)
-    cell.set_explicit_value(value)  # Force type to be string.
+    worksheet.set_cell(row, col_value, value, data_type="s")  # string
 
 
 def add_header(args, config, worksheet, row):
@@ -305,17 +308,17 @@ def add_variant(
         set_cell(worksheet, row, COL_HTSUS_NO, htsus_no)
 
 
-def get_product_variants(variants, sku):
+def get_product_variants(cc_browser, sku):
     """Returns a list of variants for a product."""
     product_variants = [
-        variant for variant in variants
+        variant for variant in cc_browser.get_variants_by_product_sku(sku)
         if variant["Product SKU"] == sku and variant["Variant Enabled"] == "Y"
     ]
     product_variants.sort(key=lambda variant: variant["Variant Sort"])
     return product_variants
 
 
-def add_product(worksheet, row, lineno, product, variants):
+def add_product(worksheet, row, lineno, product, cc_browser):
     """Add row for each variant."""
     product_name = product["Product Name"]
     sku = product["SKU"]
@@ -326,7 +329,7 @@ def add_product(worksheet, row, lineno, product, variants):
         htsus_no = product["HTSUS No"]
     else:
         htsus_no = None
-    product_variants = get_product_variants(variants, sku)
+    product_variants = get_product_variants(cc_browser, sku)
     if len(product_variants) == 0:
         description = "{}: {}".format(product_name, teaser)
         add_variant(
@@ -444,8 +447,17 @@ def add_products(worksheet, row, cc_browser, products, has_htsus_no):
     )
     row += 1
 
-    # Fetch variants list.
-    variants = cc_browser.get_variants()
+    # Set column widths.
+    worksheet.column_dimensions[col_letter(COL_LINE_NO)].width = 8
+    worksheet.column_dimensions[col_letter(COL_SKU)].width = 15
+    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
+    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
+    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 7
+    worksheet.column_dimensions[col_letter(COL_QTY)].width = 5
+    worksheet.column_dimensions[col_letter(COL_TOTAL)].width = 10
+    if has_htsus_no:
+        worksheet.column_dimensions[col_letter(COL_HTSUS_NO)].width = 13
+    worksheet.column_dimensions[col_letter(COL_INSTRUCTIONS)].width = 30
 
     # Group products by category.
     first_product_row = row
@@ -466,7 +478,7 @@ def add_products(worksheet, row, cc_browser, products, has_htsus_no):
                 row,
                 lineno,
                 product,
-                variants
+                cc_browser
             )
             category = product["Category"]
 
@@ -480,19 +492,10 @@ def add_products(worksheet, row, cc_browser, products, has_htsus_no):
             category,
             font_bold=True
         )
-    last_product_row = row - 1
 
-    # Set column widths.
-    worksheet.column_dimensions[col_letter(COL_LINE_NO)].width = 8
-    worksheet.column_dimensions[col_letter(COL_SKU)].width = 15
-    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
-    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
-    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 7
-    worksheet.column_dimensions[col_letter(COL_QTY)].width = 5
-    worksheet.column_dimensions[col_letter(COL_TOTAL)].width = 10
-    if has_htsus_no:
-        worksheet.column_dimensions[col_letter(COL_HTSUS_NO)].width = 13
-    worksheet.column_dimensions[col_letter(COL_INSTRUCTIONS)].width = 30
+        # The category is complete, so write its rows.
+        worksheet.flush(row)
+    last_product_row = row - 1
 
     return row, first_product_row, last_product_row
 
@@ -644,9 +647,8 @@ def add_totals(
     worksheet.add_data_validation(validator)
 
     # Set the cell and add to the data-validation object.
-    cell = worksheet.cell(row=row, column=col_total + 2)
-    cell.value = in_accounting_choices[0]
-    validator.add(cell)
+    worksheet.set_cell(row, col_total + 2, in_accounting_choices[0])
+    validator.add("{}{}".format(col_letter(col_total + 2), row))
 
     row += 1
 
@@ -820,6 +822,9 @@ def add_instructions(config, worksheet):
     col_instruction = 1
     row = 1
 
+    # Set column widths.
+    worksheet.column_dimensions[col_letter(col_instruction)].width = 120
+
     # Add instructions.
     for key, value in config.items("invoice"):
         if key.startswith("instruction"):
@@ -833,18 +838,15 @@ def add_instructions(config, worksheet):
             set_cell(worksheet, row, col_instruction, value, font_bold=bold)
             row += 1
 
-    # Set column widths.
-    worksheet.column_dimensions[col_letter(col_instruction)].width = 120
-
 
 def generate_xlsx(args, config, cc_browser):
     """Generate the XLS file."""
 
     # Construct a document.
-    workbook = openpyxl.workbook.Workbook()
+    workbook = xlsx_writer.StreamingWorkbook()
 
     # Create PO-Invoice worksheet.
-    add_invoice(args, config, cc_browser, workbook.worksheets[0])
+    add_invoice(args, config, cc_browser, workbook.create_sheet())
 
     # Create Instructions worksheet.
     add_instructions(config, workbook.create_sheet())
@@ -853,8 +855,8 @@ def generate_xlsx(args, config, cc_browser):
     workbook.save(args.xlsx_filename)
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
@@ -904,8 +906,28 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the PO / Commercial Invoice."""
+    # Generate spreadsheet.
+    logging.getLogger().debug(
+        "Generating {}\n".format(os.path.abspath(args.xlsx_filename))
+    )
+    generate_xlsx(args, config, cc_browser)
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -922,19 +944,18 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.RawConfigParser()
-    config.readfp(open(args.config))
+    config = read_config(args)
 
     # Create a connection to CoreCommerce.
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
-    # Generate spreadsheet.
-    logger.debug("Generating {}\n".format(os.path.abspath(args.xlsx_filename)))
-    generate_xlsx(args, config, cc_browser)
+    # Generate the PO / Commercial Invoice.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
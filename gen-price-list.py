@@ -8,6 +8,14 @@ then rounded to the nearest dollar.  The intent is to use the price
 list at fairs and shows to avoid the handling of change.  It also
 makes accounting easier because you can deal with round numbers.
 
+With --what-if-discount and/or --what-if-tax, a spreadsheet comparing
+the event prices of every product under each combination of discount
+and tax rate is generated instead of the price list.  The prices are
+calculated in a single pass over the loaded products.  For each
+scenario it reports the revenue (excluding tax) from selling one of
+each product, the difference from the --discount and --avg-tax
+scenario, and how much is lost or gained by rounding to whole dollars.
+
 The average sales tax rate is used rather than a specific rate so that
 the same price list can be used in multiple jurisdictions.  Because
 the result is rounded to the nearest dollar, the exact sales tax rate
@@ -23,19 +31,42 @@ import ConfigParser
 import argparse
 import calc_price
 import cctools
+import collections
 import datetime
+import decimal
 import itertools
 import logging
 import notify_send_handler
+import openpyxl  # sudo pip install openpyxl
 import os
 import reportlab.lib  # sudo apt-get install python-reportlab
 import reportlab.platypus
+import xlsx_writer
 
 # Best reportlab reference is the ReportLab User's Guide.
 
 # Convenience constants.
 INCH = reportlab.lib.units.inch
 
+NUMBER_FORMAT_USD = "$#,##0.00;-$#,##0.00"
+NUMBER_FORMAT_PERCENT = "0.00%"
+
+# Statistics rows of the what-if spreadsheet: (label, key, number format).
+WHAT_IF_STATISTICS = [
+    ("Discount %", "discount_percent", "General"),
+    ("Sales tax %", "sales_tax_percent", "General"),
+    ("Price list total", "total", NUMBER_FORMAT_USD),
+    ("Revenue (excl. tax)", "revenue", NUMBER_FORMAT_USD),
+    ("Revenue delta", "revenue_delta", NUMBER_FORMAT_USD),
+    ("Revenue delta %", "revenue_delta_fraction", NUMBER_FORMAT_PERCENT),
+    ("Rounding loss", "rounding_loss", NUMBER_FORMAT_USD),
+    ("Mean rounding loss", "mean_rounding_loss", NUMBER_FORMAT_USD),
+    ("Max rounding loss", "max_rounding_loss", NUMBER_FORMAT_USD),
+    ("Max rounding gain", "max_rounding_gain", NUMBER_FORMAT_USD),
+    ("Products rounded down", "n_rounded_down", "General"),
+    ("Products rounded up", "n_rounded_up", "General")
+]
+
 
 def on_page(canvas, doc):
     """Add page header and footer.  Called for each page."""
@@ -189,14 +220,15 @@ def generate_pdf(
         # Assemble table data for the product_group.
         table_data = list()
         row = 0
-        for product in product_group:
+        product_group = list(product_group)
+        prices = calc_price.calc_event_prices(
+            [product["Price"] for product in product_group],
+            args.discount_percent,
+            args.avg_tax_percent
+        )
+        for product, price in zip(product_group, prices):
             category = product["Category"]
             product_name = product["Product Name"]
-            price = calc_price.calc_event_price(
-                product["Price"],
-                args.discount_percent,
-                args.avg_tax_percent
-            )
             # Format price as whole number string like "$1,234".
             price = "${:,.0f}".format(price)
             if args.add_sku:
@@ -265,6 +297,238 @@ def generate_pdf(
     doc.build(story)
 
 
+def get_scenarios(args):
+    """
+    Return the list of (discount_percent, sales_tax_percent) what-if
+    scenarios, starting with the baseline --discount and --avg-tax.
+    """
+    baseline = (args.discount_percent, args.avg_tax_percent)
+    scenarios = [baseline]
+    for discount_percent in args.what_if_discounts or [baseline[0]]:
+        for sales_tax_percent in args.what_if_taxes or [baseline[1]]:
+            scenario = (discount_percent, sales_tax_percent)
+            if scenario not in scenarios:
+                scenarios.append(scenario)
+    return scenarios
+
+
+def calc_scenario(retail_prices, discount_percent, sales_tax_percent):
+    """
+    Calculate the event prices of a column of retail prices for one
+    scenario.  Return the event prices (as printed on the price list)
+    and a dictionary of statistics (as Decimals).
+    """
+    # Each distinct retail price is only calculated once.
+    counts = collections.Counter(retail_prices)
+    distinct_prices = list(counts)
+    event_prices = dict(
+        zip(
+            distinct_prices,
+            calc_price.calc_event_prices(
+                distinct_prices,
+                discount_percent,
+                sales_tax_percent
+            )
+        )
+    )
+
+    # Compare to the exact (unrounded) discounted and taxed prices.
+    one = decimal.Decimal(1)
+    discount_factor = one - calc_price.to_decimal(discount_percent) / 100
+    tax_factor = one + calc_price.to_decimal(sales_tax_percent) / 100
+    total = decimal.Decimal(0)
+    rounding_loss = decimal.Decimal(0)
+    max_rounding_loss = decimal.Decimal(0)
+    max_rounding_gain = decimal.Decimal(0)
+    n_rounded_down = 0
+    n_rounded_up = 0
+    for retail_price, count in counts.items():
+        event_price = calc_price.to_decimal(event_prices[retail_price])
+        exact_price = (
+            calc_price.to_decimal(retail_price) * discount_factor * tax_factor
+        )
+        loss = exact_price - event_price
+        total += event_price * count
+        rounding_loss += loss * count
+        if loss > 0:
+            max_rounding_loss = max(max_rounding_loss, loss)
+            n_rounded_down += count
+        elif loss < 0:
+            max_rounding_gain = max(max_rounding_gain, -loss)
+            n_rounded_up += count
+
+    n_products = len(retail_prices)
+    statistics = {
+        "discount_percent": discount_percent,
+        "sales_tax_percent": sales_tax_percent,
+        "total": total,
+        "revenue": total / tax_factor,
+        "rounding_loss": rounding_loss,
+        "mean_rounding_loss": rounding_loss / n_products if n_products else 0,
+        "max_rounding_loss": max_rounding_loss,
+        "max_rounding_gain": max_rounding_gain,
+        "n_rounded_down": n_rounded_down,
+        "n_rounded_up": n_rounded_up
+    }
+    return [event_prices[price] for price in retail_prices], statistics
+
+
+def calc_what_if(args, products):
+    """
+    Calculate the event prices of the products under each what-if
+    scenario.  Return a list of (event_prices, statistics) tuples, one
+    per scenario.
+    """
+    retail_prices = [product["Price"] for product in products]
+    results = [
+        calc_scenario(retail_prices, discount_percent, sales_tax_percent)
+        for discount_percent, sales_tax_percent in get_scenarios(args)
+    ]
+
+    # Compare the revenue of each scenario to the baseline scenario.
+    baseline_revenue = results[0][1]["revenue"]
+    for _, statistics in results:
+        statistics["revenue_delta"] = statistics["revenue"] - baseline_revenue
+        if baseline_revenue:
+            statistics["revenue_delta_fraction"] = (
+                statistics["revenue_delta"] / baseline_revenue
+            )
+        else:
+            statistics["revenue_delta_fraction"] = 0
+
+    return results
+
+
+def set_cell(
+    worksheet,
+    row,
+    col,
+    value,
+    font_bold=False,
+    alignment_horizontal="general",
+    number_format="General"
+):
+    """Set cell value and style."""
+    if isinstance(value, decimal.Decimal):
+        value = float(value)
+    worksheet.set_cell(
+        row,
+        col,
+        value,
+        worksheet.parent.get_style_name(
+            font_bold=font_bold,
+            alignment_horizontal=alignment_horizontal,
+            number_format=number_format
+        )
+    )
+
+
+def generate_what_if_xlsx(args, cc_browser, products):
+    """Generate the what-if spreadsheet."""
+
+    # Sort products by category, product_name.
+    products = sorted(products, key=cc_browser.product_key_by_cat_and_name)
+
+    results = calc_what_if(args, products)
+
+    workbook = xlsx_writer.StreamingWorkbook()
+    worksheet = workbook.create_sheet("Price List What-If")
+
+    # Product columns, then one event price column per scenario.
+    headings = [("Category", 20), ("Product", 40), ("SKU", 10), ("Retail", 10)]
+    for col, (_, width) in enumerate(headings, 1):
+        worksheet.column_dimensions[
+            openpyxl.utils.get_column_letter(col)
+        ].width = width
+    first_scenario_col = len(headings) + 1
+    for col in range(first_scenario_col, first_scenario_col + len(results)):
+        worksheet.column_dimensions[
+            openpyxl.utils.get_column_letter(col)
+        ].width = 14
+    worksheet.freeze_panes = openpyxl.utils.get_column_letter(
+        first_scenario_col
+    ) + "1"
+
+    # Scenario statistics.
+    row = 1
+    set_cell(
+        worksheet,
+        row,
+        first_scenario_col - 1,
+        "Scenario",
+        font_bold=True,
+        alignment_horizontal="right"
+    )
+    for i_scenario in range(len(results)):
+        set_cell(
+            worksheet,
+            row,
+            first_scenario_col + i_scenario,
+            "Scenario {}".format(i_scenario) if i_scenario else "Baseline",
+            font_bold=True,
+            alignment_horizontal="right"
+        )
+    row += 1
+    for label, key, number_format in WHAT_IF_STATISTICS:
+        set_cell(
+            worksheet,
+            row,
+            first_scenario_col - 1,
+            label,
+            font_bold=True,
+            alignment_horizontal="right"
+        )
+        for col, (_, statistics) in enumerate(results, first_scenario_col):
+            set_cell(
+                worksheet,
+                row,
+                col,
+                statistics[key],
+                number_format=number_format
+            )
+        row += 1
+    row += 1
+
+    # Event prices of each product.
+    for col, (heading, _) in enumerate(headings, 1):
+        set_cell(worksheet, row, col, heading, font_bold=True)
+    for col in range(first_scenario_col, first_scenario_col + len(results)):
+        set_cell(
+            worksheet,
+            row,
+            col,
+            "Event",
+            font_bold=True,
+            alignment_horizontal="right"
+        )
+    row += 1
+    worksheet.flush()
+    for i_product, product in enumerate(products):
+        set_cell(worksheet, row, 1, product["Category"])
+        set_cell(worksheet, row, 2, product["Product Name"])
+        set_cell(worksheet, row, 3, product["SKU"])
+        set_cell(
+            worksheet,
+            row,
+            4,
+            float(product["Price"]),
+            number_format=NUMBER_FORMAT_USD
+        )
+        for col, (event_prices, _) in enumerate(results, first_scenario_col):
+            set_cell(
+                worksheet,
+                row,
+                col,
+                event_prices[i_product],
+                number_format=NUMBER_FORMAT_USD
+            )
+        row += 1
+        worksheet.flush()
+
+    # Write to file.
+    workbook.save(args.what_if_file)
+
+
 def get_products(args, cc_browser):
     """Get product list from CoreCommerce and filter it."""
 
@@ -287,7 +551,7 @@ def get_products(args, cc_browser):
     if args.categories:
         cc_browser.set_category_sort_order(args.categories)
         products = [p for p in products if p["Category"] in args.categories]
-    elif args.epclude_categories:
+    elif args.exclude_categories:
         products = [
             p for p in products if p["Category"] not in args.exclude_categories
         ]
@@ -301,8 +565,8 @@ def get_products(args, cc_browser):
     return products
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     # Construct default filename of configuration file.
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
@@ -387,6 +651,28 @@ def main():
         default=8.3,
         help="average sales tax rate in percent (default=%(default).2f)"
     )
+    arg_parser.add_argument(
+        "--what-if-discount",
+        type=float,
+        action="append",
+        dest="what_if_discounts",
+        metavar="PCT",
+        help="compare prices at this discount (may be repeated)"
+    )
+    arg_parser.add_argument(
+        "--what-if-tax",
+        type=float,
+        action="append",
+        dest="what_if_taxes",
+        metavar="PCT",
+        help="compare prices at this sales tax rate (may be repeated)"
+    )
+    arg_parser.add_argument(
+        "--what-if-file",
+        metavar="XLSX_FILE",
+        default="PriceListWhatIf.xlsx",
+        help="output what-if spreadsheet filename (default=%(default)s)"
+    )
     arg_parser.add_argument(
         "--verbose",
         action="store_true",
@@ -394,8 +680,7 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    args = arg_parser.parse_args(argv)
     if args.categories and args.exclude_categories:
         arg_parser.error("--category and --exclude-category specified")
     if args.ncols is None:
@@ -403,6 +688,47 @@ def main():
             args.ncols = 1
         else:
             args.ncols = 2
+    return args
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.SafeConfigParser({
+        "body_fontsize": "12",
+        "row_padding": "0"
+    })
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the price list."""
+    # Get product list.
+    products = get_products(args, cc_browser)
+
+    # Generate what-if spreadsheet instead of the price list.
+    if args.what_if_discounts or args.what_if_taxes:
+        logging.getLogger().debug(
+            "Generating {}\n".format(os.path.abspath(args.what_if_file))
+        )
+        generate_what_if_xlsx(args, cc_browser, products)
+        return
+
+    # Generate PDF file.
+    logging.getLogger().debug(
+        "Generating {}\n".format(os.path.abspath(args.pdf_file))
+    )
+    generate_pdf(
+        args,
+        config,
+        cc_browser,
+        products
+    )
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -419,33 +745,22 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.SafeConfigParser({
-        "body_fontsize": "12",
-        "row_padding": "0"
-    })
-    config.readfp(open(args.config))
+    config = read_config(args)
 
     # Create a connection to CoreCommerce.
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
-    # Get product list.
-    products = get_products(args, cc_browser)
-
-    # Generate PDF file.
-    logger.debug("Generating {}\n".format(os.path.abspath(args.pdf_file)))
-    generate_pdf(
-        args,
-        config,
-        cc_browser,
-        products
-    )
+    # Generate the price list.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
 
+
 if __name__ == "__main__":
     main()
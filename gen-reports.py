@@ -0,0 +1,216 @@
+#!/usr/bin/env python2
+
+"""
+Generates several reports from a single load of the CoreCommerce
+catalog.
+
+Each REPORT argument is a report name optionally followed by the
+command line options of its gen-*.py script, for example:
+
+    gen-reports.py --dir=reports \\
+        inventory-report \\
+        "price-list --category=Necklaces --exclude-sku=40012" \\
+        "wholesale-order --exclude-sku=30001"
+
+The catalog is downloaded (if needed) and loaded once.  Each report is
+then rendered by its own forked worker process, which inherits the
+loaded catalog, so independent reports are rendered in parallel and
+cannot affect each other (e.g., by changing the category sort order).
+"""
+
+import ConfigParser
+import argparse
+import collections
+import imp
+import logging
+import multiprocessing
+import os
+import shlex
+import sys
+import timeit
+
+import cctools
+import notify_send_handler
+
+# Report names and the scripts that generate them.
+REPORTS = collections.OrderedDict([
+    ("fedex-product-dict", "gen-fedex-product-dict.py"),
+    ("inventory-report", "gen-inventory-report.py"),
+    ("inventory-tracker", "gen-inventory-tracker.py"),
+    ("po-comm-invoice", "gen-po-comm-invoice.py"),
+    ("price-list", "gen-price-list.py"),
+    ("wholesale-line-sheet", "gen-wholesale-line-sheet.py"),
+    ("wholesale-order", "gen-wholesale-order.py"),
+])
+
+# The loaded catalog and the (name, module, args, config) of each
+# report.  Forked workers inherit them.
+_POOL_CC_BROWSER = None
+_POOL_REPORTS = None
+
+
+def load_report_module(name):
+    """Load the gen-*.py script of a report as a module."""
+    filename = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        REPORTS[name]
+    )
+    module_name = os.path.splitext(REPORTS[name])[0].replace("-", "_")
+    return imp.load_source(module_name, filename)
+
+
+def load_catalog(config):
+    """Create a connection to CoreCommerce and load the catalog."""
+    cc_browser = cctools.CCBrowser(
+        config.get("website", "base_url"),
+        config.get("website", "username"),
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
+    )
+
+    # Download all exports up front (concurrently if export_concurrency
+    # is configured), then load and index everything the reports use.
+    cc_browser.prefetch_exports()
+    cc_browser.get_categories()
+    cc_browser.get_products()
+    cc_browser.get_variants()
+    cc_browser.get_index("variants", "Product SKU")
+    return cc_browser
+
+
+def generate_report(report_id):
+    """
+    Generate a report in a pool worker.  Return the report name, the
+    elapsed time in seconds, and an error message (None if successful).
+    """
+    name, module, args, config = _POOL_REPORTS[report_id]
+    start = timeit.default_timer()
+    try:
+        module.generate(args, config, _POOL_CC_BROWSER)
+        error = None
+    except Exception as ex:  # pylint: disable=broad-except
+        error = "{}: {}".format(type(ex).__name__, ex)
+    return name, timeit.default_timer() - start, error
+
+
+def main():
+    """main"""
+    # pylint: disable=W0603
+    global _POOL_CC_BROWSER, _POOL_REPORTS
+
+    default_config = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "cctools.cfg"
+    )
+
+    arg_parser = argparse.ArgumentParser(
+        description="Generates several reports from one catalog load.",
+        epilog="Reports: {}.".format(", ".join(REPORTS))
+    )
+    arg_parser.add_argument(
+        "--config",
+        metavar="FILE",
+        default=default_config,
+        help="configuration filename (default=%(default)s)"
+    )
+    arg_parser.add_argument(
+        "--dir",
+        metavar="DIR",
+        help="output directory (default=current directory)"
+    )
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        metavar="N",
+        default=multiprocessing.cpu_count(),
+        help="number of reports generated at the same time "
+             "(default=%(default)i)"
+    )
+    arg_parser.add_argument(
+        "--verbose",
+        action="store_true",
+        default=False,
+        help="display progress messages"
+    )
+    arg_parser.add_argument(
+        "reports",
+        nargs="+",
+        metavar="REPORT",
+        help="report name followed by options for its script"
+    )
+
+    # Parse command line arguments.
+    args = arg_parser.parse_args()
+    args.config = os.path.abspath(args.config)
+
+    # Configure logging.
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING
+    )
+    logger = logging.getLogger()
+
+    # Also log using notify-send if it is available.
+    if notify_send_handler.NotifySendHandler.is_available():
+        logger.addHandler(
+            notify_send_handler.NotifySendHandler(
+                os.path.splitext(os.path.basename(__file__))[0]
+            )
+        )
+
+    # Parse the options of each report with its own script.
+    reports = []
+    for report in args.reports:
+        report_argv = shlex.split(report)
+        if not report_argv or report_argv[0] not in REPORTS:
+            arg_parser.error("unknown report '{}'".format(report))
+        name = report_argv[0]
+        module = load_report_module(name)
+        report_args = module.parse_args(
+            ["--config", args.config] + report_argv[1:]
+        )
+        reports.append(
+            (name, module, report_args, module.read_config(report_args))
+        )
+
+    # Relative output filenames are relative to the output directory.
+    if args.dir:
+        os.chdir(args.dir)
+
+    # Read config file.
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+
+    # Load the catalog once for all reports.
+    logger.info("Loading catalog")
+    _POOL_CC_BROWSER = load_catalog(config)
+    _POOL_REPORTS = reports
+
+    # Generate each report in a worker that is used for only that
+    # report.
+    status = 0
+    n_jobs = max(1, min(args.jobs, len(reports)))
+    if hasattr(os, "fork"):
+        pool = multiprocessing.Pool(n_jobs, maxtasksperchild=1)
+        results = pool.imap_unordered(generate_report, range(len(reports)))
+    else:
+        pool = None
+        results = (generate_report(i) for i in range(len(reports)))
+    try:
+        for name, seconds, error in results:
+            if error is None:
+                logger.info("Generated %s in %.1fs", name, seconds)
+            else:
+                logger.error("Cannot generate %s: %s", name, error)
+                status = 1
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    logger.debug("Generation complete")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
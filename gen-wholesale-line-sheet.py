@@ -15,7 +15,7 @@ import ConfigParser
 import calc_price
 import cctools
 import notify_send_handler
-import openpyxl  # sudo pip install openpyxl
+import xlsx_writer
 
 CHECK_FOR_LACK_OF_ANY = False  # until most "Any" variants have been added
 
@@ -42,15 +42,18 @@ def set_cell(
     number_format="General"
 ):
     """Set cell value and style."""
-    cell = worksheet.cell(row=row, column=col)
-    cell.value = value
-    cell.font = openpyxl.styles.Font(bold=font_bold, size=font_size)
-    cell.alignment = openpyxl.styles.Alignment(
-        horizontal=alignment_horizontal,
-        vertical=alignment_vertical
+    worksheet.set_cell(
+        row,
+        col,
+        value,
+        worksheet.parent.get_style_name(
+            font_bold=font_bold,
+            font_size=font_size,
+            alignment_horizontal=alignment_horizontal,
+            alignment_vertical=alignment_vertical,
+            number_format=number_format
+        )
     )
-    if number_format != "General":
-        cell.number_format = number_format
 
 
 def col_letter(col):
@@ -157,17 +160,17 @@ def add_variant(
     set_cell(worksheet, row, COL_SKU, sku)
 
 
-def get_product_variants(variants, sku):
+def get_product_variants(cc_browser, sku):
     """Returns a list of variants for a product."""
     product_variants = [
-        variant for variant in variants
+        variant for variant in cc_browser.get_variants_by_product_sku(sku)
         if variant["Product SKU"] == sku and variant["Variant Enabled"] == "Y"
     ]
     product_variants.sort(key=lambda variant: variant["Variant Sort"])
     return product_variants
 
 
-def add_product(args, worksheet, row, item_no, product, variants):
+def add_product(args, worksheet, row, item_no, product, cc_browser):
     """Add row for each variant."""
     size = product["Size"]
     product_name = product["Product Name"]
@@ -179,13 +182,23 @@ def add_product(args, worksheet, row, item_no, product, variants):
         math.floor(price / args.price_precision + 0.5) * args.price_precision
 
     if args.include_variants:
-        product_variants = get_product_variants(variants, sku)
+        product_variants = get_product_variants(cc_browser, sku)
     else:
         product_variants = []
 
     if product_variants:
+        wholesale_prices = calc_price.calc_wholesale_prices(
+            [
+                price + float(variant["Variant Add Price"])
+                for variant in product_variants
+            ],
+            args.wholesale_fraction
+        )
         any_variant_exists = False
-        for variant in product_variants:
+        for variant, wholesale_price in zip(
+            product_variants,
+            wholesale_prices
+        ):
             variant_sku = variant["Variant SKU"]
             if variant_sku == "ANY" or variant_sku == "VAR":
                 any_variant_exists = True
@@ -204,10 +217,7 @@ def add_product(args, worksheet, row, item_no, product, variants):
                 size,
                 variant_sku,
                 description,
-                calc_price.calc_wholesale_price(
-                    price + variant_add_price,
-                    args.wholesale_fraction
-                ),
+                wholesale_price,
                 msrp + variant_add_price
             )
             row += 1
@@ -282,6 +292,14 @@ def add_products(args, worksheet, row, cc_browser, products):
     )
     row += 1
 
+    # Set column widths.
+    worksheet.column_dimensions[col_letter(COL_ITEM_NO)].width = 8
+    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
+    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 8
+    worksheet.column_dimensions[col_letter(COL_MSRP)].width = 8
+    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
+    worksheet.column_dimensions[col_letter(COL_SKU)].width = 14
+
     # Remove excluded SKUs.
     if args.exclude_skus:
         products = [
@@ -291,9 +309,6 @@ def add_products(args, worksheet, row, cc_browser, products):
     # Sort products by category, product_name.
     products = sorted(products, key=cc_browser.product_key_by_cat_and_name)
 
-    # Fetch variants list.
-    variants = cc_browser.get_variants()
-
     # Group products by category.
     item_no = 1
     for _, product_group in itertools.groupby(
@@ -316,7 +331,7 @@ def add_products(args, worksheet, row, cc_browser, products):
                 row,
                 item_no,
                 product,
-                variants
+                cc_browser
             )
             category = product["Category"]
 
@@ -331,13 +346,8 @@ def add_products(args, worksheet, row, cc_browser, products):
             font_bold=True
         )
 
-    # Set column widths.
-    worksheet.column_dimensions[col_letter(COL_ITEM_NO)].width = 8
-    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
-    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 8
-    worksheet.column_dimensions[col_letter(COL_MSRP)].width = 8
-    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
-    worksheet.column_dimensions[col_letter(COL_SKU)].width = 14
+        # The category is complete, so write its rows.
+        worksheet.flush(row)
 
 
 def add_line_sheet(args, config, cc_browser, products, worksheet):
@@ -360,7 +370,7 @@ def generate_xlsx(args, config, cc_browser, products):
     """Generate the XLS file."""
 
     # Construct a document.
-    workbook = openpyxl.workbook.Workbook()
+    workbook = xlsx_writer.StreamingWorkbook()
 
     # Create Line Sheet worksheet.
     add_line_sheet(
@@ -368,15 +378,15 @@ def generate_xlsx(args, config, cc_browser, products):
         config,
         cc_browser,
         products,
-        workbook.worksheets[0]
+        workbook.create_sheet()
     )
 
     # Write to file.
     workbook.save(args.xlsx_filename)
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
@@ -448,27 +458,18 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
 
-    # Configure logging.
-    logging.basicConfig(
-        level=logging.INFO if args.verbose else logging.WARNING
-    )
-    logger = logging.getLogger()
-
-    # Also log using notify-send if it is available.
-    if notify_send_handler.NotifySendHandler.is_available():
-        logger.addHandler(
-            notify_send_handler.NotifySendHandler(
-                os.path.splitext(os.path.basename(__file__))[0]
-            )
-        )
 
-    # Read config file.
+def read_config(args):
+    """Read the configuration file."""
     config = ConfigParser.RawConfigParser()
     config.readfp(open(args.config))
+    return config
+
 
+def generate(args, config, cc_browser):
+    """Generate the wholesale line sheet."""
     # Handle the price multiplier.
     if args.price_multiplier is None:
         price_multiplier = get_optional_option(
@@ -481,19 +482,45 @@ def main():
         else:
             args.price_multiplier = float(price_multiplier)
 
+    # Fetch products list.
+    products = cc_browser.get_products()
+
+    # Generate spreadsheet.
+    logging.getLogger().debug("Generating {}".format(args.xlsx_filename))
+    generate_xlsx(args, config, cc_browser, products)
+
+
+def main():
+    """main"""
+    args = parse_args()
+
+    # Configure logging.
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING
+    )
+    logger = logging.getLogger()
+
+    # Also log using notify-send if it is available.
+    if notify_send_handler.NotifySendHandler.is_available():
+        logger.addHandler(
+            notify_send_handler.NotifySendHandler(
+                os.path.splitext(os.path.basename(__file__))[0]
+            )
+        )
+
+    # Read config file.
+    config = read_config(args)
+
     # Create a connection to CoreCommerce.
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
-    # Fetch products list.
-    products = cc_browser.get_products()
-
-    # Generate spreadsheet.
-    logger.debug("Generating {}".format(args.xlsx_filename))
-    generate_xlsx(args, config, cc_browser, products)
+    # Generate the wholesale line sheet.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
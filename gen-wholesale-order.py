@@ -14,7 +14,7 @@ import ConfigParser
 import calc_price
 import cctools
 import notify_send_handler
-import openpyxl  # sudo pip install openpyxl
+import xlsx_writer
 
 CHECK_FOR_LACK_OF_ANY = False  # until most "Any" variants have been added
 
@@ -42,15 +42,18 @@ def set_cell(
     number_format="General"
 ):
     """Set cell value and style."""
-    cell = worksheet.cell(row=row, column=col)
-    cell.value = value
-    cell.font = openpyxl.styles.Font(bold=font_bold, size=font_size)
-    cell.alignment = openpyxl.styles.Alignment(
-        horizontal=alignment_horizontal,
-        vertical=alignment_vertical
+    worksheet.set_cell(
+        row,
+        col,
+        value,
+        worksheet.parent.get_style_name(
+            font_bold=font_bold,
+            font_size=font_size,
+            alignment_horizontal=alignment_horizontal,
+            alignment_vertical=alignment_vertical,
+            number_format=number_format
+        )
     )
-    if number_format != "General":
-        cell.number_format = number_format
 
 
 def col_letter(col):
@@ -113,8 +116,6 @@ def add_ship_to(worksheet, row):
 
     nrows = 3
     for i in range(0, nrows):
-        cell = worksheet.cell(row=row, column=start_col)
-        cell.alignment = openpyxl.styles.Alignment(horizontal="left")
         worksheet.merge_cells(
             start_row=row,
             start_column=start_col,
@@ -122,32 +123,20 @@ def add_ship_to(worksheet, row):
             end_column=end_col
         )
         for col in range(start_col, end_col + 1):
-            default_side = openpyxl.styles.Side(
-                border_style=None,
-                color='FF000000'
+            border = (
+                "thin" if col == start_col else None,  # left
+                "thin" if col == end_col else None,  # right
+                "thin" if i == 0 else None,  # top
+                "thin" if i == nrows - 1 else None  # bottom
             )
-            if i == 0:
-                top = openpyxl.styles.Side("thin")  # BORDER_THIN
-            else:
-                top = default_side
-            if i == nrows - 1:
-                bottom = openpyxl.styles.Side("thin")
-            else:
-                bottom = default_side
-            if col == start_col:
-                left = openpyxl.styles.Side("thin")
-            else:
-                left = default_side
-            if col == end_col:
-                right = openpyxl.styles.Side("thin")
-            else:
-                right = default_side
-            cell = worksheet.cell(row=row, column=col)
-            cell.border = openpyxl.styles.Border(
-                left=left,
-                right=right,
-                top=top,
-                bottom=bottom
+            worksheet.set_cell(
+                row,
+                col,
+                None,
+                worksheet.parent.get_style_name(
+                    alignment_horizontal="left",
+                    border=border
+                )
             )
         row += 1
 
@@ -229,17 +218,17 @@ def add_variant(
     set_cell(worksheet, row, COL_SKU, sku)
 
 
-def get_product_variants(variants, sku):
+def get_product_variants(cc_browser, sku):
     """Returns a list of variants for a product."""
     product_variants = [
-        variant for variant in variants
+        variant for variant in cc_browser.get_variants_by_product_sku(sku)
         if variant["Product SKU"] == sku and variant["Variant Enabled"] == "Y"
     ]
     product_variants.sort(key=lambda variant: variant["Variant Sort"])
     return product_variants
 
 
-def add_product(args, worksheet, row, item_no, product, variants):
+def add_product(args, worksheet, row, item_no, product, cc_browser):
     """Add row for each variant."""
     size = product["Size"]
     product_name = product["Product Name"]
@@ -248,7 +237,7 @@ def add_product(args, worksheet, row, item_no, product, variants):
     price = float(product["Price"])
 
     if args.include_variants:
-        product_variants = get_product_variants(variants, sku)
+        product_variants = get_product_variants(cc_browser, sku)
     else:
         product_variants = []
 
@@ -266,13 +255,22 @@ def add_product(args, worksheet, row, item_no, product, variants):
         row += 1
         item_no += 1
     else:
+        wholesale_prices = calc_price.calc_wholesale_prices(
+            [
+                price + float(variant["Variant Add Price"])
+                for variant in product_variants
+            ],
+            args.wholesale_fraction
+        )
         any_variant_exists = False
-        for variant in product_variants:
+        for variant, wholesale_price in zip(
+            product_variants,
+            wholesale_prices
+        ):
             variant_sku = variant["Variant SKU"]
             if variant_sku == "ANY" or variant_sku == "VAR":
                 any_variant_exists = True
             variant_sku = "{}-{}".format(sku, variant_sku)
-            variant_add_price = float(variant["Variant Add Price"])
             variant_name = variant["Variant Name"]
             description = "{} ({}): {}".format(
                 product_name,
@@ -286,10 +284,7 @@ def add_product(args, worksheet, row, item_no, product, variants):
                 size,
                 variant_sku,
                 description,
-                calc_price.calc_wholesale_price(
-                    price + variant_add_price,
-                    args.wholesale_fraction
-                )
+                wholesale_price
             )
             row += 1
             item_no += 1
@@ -359,6 +354,15 @@ def add_products(args, worksheet, row, cc_browser, products):
     )
     row += 1
 
+    # Set column widths.
+    worksheet.column_dimensions[col_letter(COL_ITEM_NO)].width = 8
+    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
+    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 8
+    worksheet.column_dimensions[col_letter(COL_QTY)].width = 5
+    worksheet.column_dimensions[col_letter(COL_TOTAL)].width = 10
+    worksheet.column_dimensions[col_letter(COL_SKU)].width = 14
+    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
+
     # Remove excluded SKUs.
     if args.exclude_skus:
         products = [
@@ -368,9 +372,6 @@ def add_products(args, worksheet, row, cc_browser, products):
     # Sort products by category, product_name.
     products = sorted(products, key=cc_browser.product_key_by_cat_and_name)
 
-    # Fetch variants list.
-    variants = cc_browser.get_variants()
-
     # Group products by category.
     first_product_row = row
     item_no = 1
@@ -394,7 +395,7 @@ def add_products(args, worksheet, row, cc_browser, products):
                 row,
                 item_no,
                 product,
-                variants
+                cc_browser
             )
             category = product["Category"]
             last_product_row = row - 1
@@ -410,14 +411,8 @@ def add_products(args, worksheet, row, cc_browser, products):
             font_bold=True
         )
 
-    # Set column widths.
-    worksheet.column_dimensions[col_letter(COL_ITEM_NO)].width = 8
-    worksheet.column_dimensions[col_letter(COL_DESCRIPTION)].width = 100
-    worksheet.column_dimensions[col_letter(COL_PRICE)].width = 8
-    worksheet.column_dimensions[col_letter(COL_QTY)].width = 5
-    worksheet.column_dimensions[col_letter(COL_TOTAL)].width = 10
-    worksheet.column_dimensions[col_letter(COL_SKU)].width = 14
-    worksheet.column_dimensions[col_letter(COL_SIZE)].width = 28
+        # The category is complete, so write its rows.
+        worksheet.flush(row)
 
     # Blank row.
     row += 1
@@ -519,7 +514,7 @@ def generate_xlsx(args, config, cc_browser, products):
     """Generate the XLS file."""
 
     # Construct a document.
-    workbook = openpyxl.workbook.Workbook()
+    workbook = xlsx_writer.StreamingWorkbook()
 
     # Create PO-Invoice worksheet.
     add_order_form(
@@ -527,15 +522,15 @@ def generate_xlsx(args, config, cc_browser, products):
         config,
         cc_browser,
         products,
-        workbook.worksheets[0]
+        workbook.create_sheet()
     )
 
     # Write to file.
     workbook.save(args.xlsx_filename)
 
 
-def main():
-    """main"""
+def parse_args(argv=None):
+    """Parse command line arguments (default=sys.argv[1:])."""
     default_config = os.path.join(
         os.path.dirname(os.path.abspath(__file__)),
         "cctools.cfg"
@@ -595,8 +590,29 @@ def main():
         help="display progress messages"
     )
 
-    # Parse command line arguments.
-    args = arg_parser.parse_args()
+    return arg_parser.parse_args(argv)
+
+
+def read_config(args):
+    """Read the configuration file."""
+    config = ConfigParser.RawConfigParser()
+    config.readfp(open(args.config))
+    return config
+
+
+def generate(args, config, cc_browser):
+    """Generate the wholesale order form."""
+    # Fetch products list.
+    products = cc_browser.get_products()
+
+    # Generate spreadsheet.
+    logging.getLogger().debug("Generating {}".format(args.xlsx_filename))
+    generate_xlsx(args, config, cc_browser, products)
+
+
+def main():
+    """main"""
+    args = parse_args()
 
     # Configure logging.
     logging.basicConfig(
@@ -613,22 +629,18 @@ def main():
         )
 
     # Read config file.
-    config = ConfigParser.RawConfigParser()
-    config.readfp(open(args.config))
+    config = read_config(args)
 
     # Create a connection to CoreCommerce.
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
-    # Fetch products list.
-    products = cc_browser.get_products()
-
-    # Generate spreadsheet.
-    logger.debug("Generating {}".format(args.xlsx_filename))
-    generate_xlsx(args, config, cc_browser, products)
+    # Generate the wholesale order form.
+    generate(args, config, cc_browser)
 
     logger.debug("Generation complete")
     return 0
@@ -193,7 +193,12 @@ def generate_pdf(
         table_data = list()
         row = 0
 
-        for product in product_group:
+        product_group = list(product_group)
+        prices = calc_price.calc_wholesale_prices(
+            [product["Price"] for product in product_group],
+            args.wholesale_fraction
+        )
+        for product, price in zip(product_group, prices):
             category = product["Category"]
 
             if row == 0:
@@ -207,10 +212,6 @@ def generate_pdf(
                 product_name = "{} - {}".format(product["SKU"], product_name)
 
             # Price column formatted as a whole number string like "$1,234.99".
-            price = calc_price.calc_wholesale_price(
-                product["Price"],
-                args.wholesale_fraction
-            )
             price = "${:,.2f}".format(price)
 
             row_data = (product_name, price, "", "")
@@ -324,7 +325,7 @@ def get_products(args, cc_browser):
     if args.categories:
         cc_browser.set_category_sort_order(args.categories)
         products = [p for p in products if p["Category"] in args.categories]
-    elif args.epclude_categories:
+    elif args.exclude_categories:
         products = [
             p for p in products if p["Category"] not in args.exclude_categories
         ]
@@ -452,7 +453,8 @@ def main():
     cc_browser = cctools.CCBrowser(
         config.get("website", "base_url"),
         config.get("website", "username"),
-        config.get("website", "password")
+        config.get("website", "password"),
+        **cctools.get_browser_options(config)
     )
 
     # Get product list.
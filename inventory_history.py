@@ -0,0 +1,239 @@
+#!/usr/bin/env python2
+
+"""
+Append-only history of CoreCommerce inventory levels.
+
+Each snapshot records the inventory level of every SKU (products that
+are tracked by product, and the variants of the other products) at
+the time the exports were downloaded.  Only the SKUs whose level
+changed since the previous snapshot are written, so the store grows
+with the number of changes rather than with the size of the catalog.
+A SKU that disappears from the catalog is recorded with a level of
+None.  Rows are never updated or deleted.
+
+The history is kept in an SQLite database (inventory_history.sqlite
+in the cctools cache directory by default) with an index on SKU and
+snapshot, so queries only read the changes of the SKUs involved.
+"""
+
+import os
+import sqlite3
+import time
+
+# Exports that the inventory levels are derived from.
+INVENTORY_EXPORTS = ("products", "personalizations", "product_options")
+
+
+def get_default_filename(cc_browser):
+    """Return the filename of the history store of a CCBrowser."""
+    return os.path.join(cc_browser.cache_dir, "inventory_history.sqlite")
+
+
+def get_inventory_levels(cc_browser):
+    """Return a dictionary that maps each SKU to its inventory level."""
+    return dict(
+        (row["SKU"], row["Inventory Level"])
+        for row in cc_browser.iter_inventory()
+    )
+
+
+def parse_level(level):
+    """Return an inventory level as an int, or None if it is not one."""
+    try:
+        return int(level)
+    except (TypeError, ValueError):
+        return None
+
+
+class InventoryHistory(object):
+    """Append-only store of inventory level snapshots."""
+
+    def __init__(self, filename):
+        self._connection = sqlite3.connect(filename)
+        self._connection.text_factory = str
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots"
+                " (snapshot INTEGER PRIMARY KEY, time REAL UNIQUE)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS levels"
+                " (sku TEXT, snapshot INTEGER, level TEXT,"
+                " PRIMARY KEY (sku, snapshot))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS levels_snapshot"
+                " ON levels (snapshot)"
+            )
+
+    def close(self):
+        """Close the store."""
+        self._connection.close()
+
+    def get_last_time(self):
+        """Return the time of the latest snapshot, or None."""
+        return self._connection.execute(
+            "SELECT MAX(time) FROM snapshots"
+        ).fetchone()[0]
+
+    def get_levels(self, at_time=None):
+        """
+        Return a dictionary that maps each SKU to its inventory level
+        in the latest snapshot taken at or before at_time (default=the
+        latest snapshot).  SKUs that were removed are omitted.
+        """
+        if at_time is None:
+            at_time = float("inf")
+        # SQLite returns the level of the row with the MAX(snapshot).
+        cursor = self._connection.execute(
+            "SELECT levels.sku, levels.level, MAX(levels.snapshot)"
+            " FROM levels JOIN snapshots USING (snapshot)"
+            " WHERE snapshots.time <= ? GROUP BY levels.sku",
+            (at_time,)
+        )
+        return dict(
+            (sku, level) for sku, level, _ in cursor if level is not None
+        )
+
+    def append(self, snapshot_time, levels):
+        """
+        Append a snapshot of levels (a dictionary that maps SKU to
+        inventory level) taken at snapshot_time (seconds since the
+        epoch).  Return the number of SKUs whose level changed, or None
+        if a snapshot at or after snapshot_time has already been
+        recorded.
+        """
+        last_time = self.get_last_time()
+        if last_time is not None and snapshot_time <= last_time:
+            return None
+
+        previous = self.get_levels()
+        changes = [
+            (sku, level) for sku, level in levels.items()
+            if previous.get(sku) != level
+        ]
+        changes.extend(
+            (sku, None) for sku in previous if sku not in levels
+        )
+
+        with self._connection:
+            # Another process may have recorded the same snapshot since
+            # get_last_time() was called.
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO snapshots (time) VALUES (?)",
+                (snapshot_time,)
+            )
+            if cursor.rowcount == 0:
+                return None
+            snapshot = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT INTO levels (sku, snapshot, level) VALUES (?, ?, ?)",
+                (
+                    (sku, snapshot, None if level is None else str(level))
+                    for sku, level in changes
+                )
+            )
+        return len(changes)
+
+    def get_sku_history(self, sku, start_time, end_time=None):
+        """
+        Return a list of the (time, level) changes of a SKU between
+        start_time and end_time (default=now), starting with the level
+        that was current at start_time if there was one.
+        """
+        if end_time is None:
+            end_time = time.time()
+        history = list()
+        row = self._connection.execute(
+            "SELECT time, level FROM levels JOIN snapshots USING (snapshot)"
+            " WHERE sku = ? AND time <= ? ORDER BY snapshot DESC LIMIT 1",
+            (sku, start_time)
+        ).fetchone()
+        if row is not None and row[1] is not None:
+            history.append((start_time, row[1]))
+        history.extend(
+            self._connection.execute(
+                "SELECT time, level FROM levels JOIN snapshots"
+                " USING (snapshot)"
+                " WHERE sku = ? AND time > ? AND time <= ?"
+                " ORDER BY snapshot",
+                (sku, start_time, end_time)
+            )
+        )
+        return history
+
+    def get_sales(self, start_time, end_time=None):
+        """
+        Return a list of (sku, start_level, end_level, sold, restocked)
+        tuples for the SKUs whose level changed between start_time and
+        end_time (default=now), sorted by SKU.  start_level is the
+        level at start_time, or the first recorded level if the SKU was
+        first recorded after start_time.  sold is the total of the
+        decreases in level and restocked is the total of the increases.
+        A level that is not a number (such as a removed SKU) is
+        skipped, so a change is measured from the last numeric level.
+        """
+        if end_time is None:
+            end_time = time.time()
+        start_levels = self.get_levels(start_time)
+        cursor = self._connection.execute(
+            "SELECT sku, level FROM levels JOIN snapshots USING (snapshot)"
+            " WHERE time > ? AND time <= ? ORDER BY sku, snapshot",
+            (start_time, end_time)
+        )
+        sales = list()
+        current_sku = None
+        for sku, level in cursor:
+            if sku != current_sku:
+                if current_sku is not None:
+                    sales.append(
+                        (current_sku, start_level, end_level, sold, restocked)
+                    )
+                current_sku = sku
+                start_level = start_levels.get(sku)
+                end_level = start_level
+                last_level = parse_level(start_level)
+                sold = 0
+                restocked = 0
+            if start_level is None:
+                start_level = level
+            new_level = parse_level(level)
+            if new_level is not None:
+                if last_level is not None:
+                    if new_level < last_level:
+                        sold += last_level - new_level
+                    else:
+                        restocked += new_level - last_level
+                last_level = new_level
+            end_level = level
+        if current_sku is not None:
+            sales.append(
+                (current_sku, start_level, end_level, sold, restocked)
+            )
+        return sales
+
+
+def record_snapshot(cc_browser, filename=None):
+    """
+    Append the current inventory levels of a CCBrowser to the history
+    store (default=the store in the cache directory).  The levels are
+    built first, which downloads any expired inventory exports, and
+    the snapshot time is then when the newest of those exports was
+    downloaded, so a snapshot of the same exports is only recorded
+    once.  Return the number of SKUs whose level changed, or None if
+    the snapshot has already been recorded.
+    """
+    levels = get_inventory_levels(cc_browser)
+    snapshot_time = max(
+        cc_browser.get_export_time(name) for name in INVENTORY_EXPORTS
+    )
+    history = InventoryHistory(
+        filename or get_default_filename(cc_browser)
+    )
+    try:
+        last_time = history.get_last_time()
+        if last_time is not None and snapshot_time <= last_time:
+            return None
+        return history.append(snapshot_time, levels)
+    finally:
+        history.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+
+"""
+Writes XLSX spreadsheets using openpyxl's write-only mode.
+
+A normal openpyxl workbook keeps every cell, with its own style
+objects, in memory until the workbook is saved.  A StreamingWorksheet
+instead keeps only the rows that have not been flushed yet, as plain
+tuples, and appends rows to the file when they are flushed, so memory
+use does not grow with the number of rows.  Until a row is flushed,
+its cells can be set in any order (e.g., to fill in a category heading
+after the products below it have been added).
+
+Each distinct cell format is registered once per workbook as a named
+style, which all of the cells with that format share.
+
+Column widths, row heights and frozen panes are written before the
+first row, so they must be set before the first call to flush().
+
+openpyxl only streams the rows to the file if lxml is installed.
+"""
+
+import openpyxl  # sudo pip install openpyxl
+
+
+def make_border(border):
+    """
+    Return an openpyxl Border given a (left, right, top, bottom) tuple
+    of side styles (e.g., "thin"), where None means no border.
+    """
+    left, right, top, bottom = [
+        openpyxl.styles.Side(border_style=side, color="FF000000")
+        for side in border
+    ]
+    return openpyxl.styles.Border(
+        left=left,
+        right=right,
+        top=top,
+        bottom=bottom
+    )
+
+
+class StreamingWorkbook(object):
+    """A write-only workbook whose cells share named styles."""
+
+    def __init__(self):
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.worksheets = []
+        self._style_names = {}
+
+    def create_sheet(self, title=None):
+        """Create and return a new StreamingWorksheet."""
+        worksheet = StreamingWorksheet(self, self.workbook.create_sheet(title))
+        self.worksheets.append(worksheet)
+        return worksheet
+
+    def get_style_name(
+        self,
+        font_bold=False,
+        font_size=11,
+        alignment_horizontal="general",
+        alignment_vertical="bottom",
+        number_format="General",
+        border=None
+    ):
+        """
+        Return the name of the named style with the given format,
+        adding the style to the workbook the first time it is used.
+        """
+        key = (
+            font_bold,
+            font_size,
+            alignment_horizontal,
+            alignment_vertical,
+            number_format,
+            border
+        )
+        if key not in self._style_names:
+            name = "cctools {}".format(len(self._style_names) + 1)
+            style = openpyxl.styles.NamedStyle(
+                name=name,
+                font=openpyxl.styles.Font(bold=font_bold, size=font_size),
+                alignment=openpyxl.styles.Alignment(
+                    horizontal=alignment_horizontal,
+                    vertical=alignment_vertical
+                ),
+                number_format=number_format
+            )
+            if border is not None:
+                style.border = make_border(border)
+            self.workbook.add_named_style(style)
+            self._style_names[key] = name
+        return self._style_names[key]
+
+    def save(self, filename):
+        """Flush all worksheets and write the workbook to a file."""
+        if not self.worksheets:
+            self.create_sheet()  # a workbook needs at least one sheet
+        for worksheet in self.worksheets:
+            worksheet.flush()
+        self.workbook.save(filename)
+
+
+class StreamingWorksheet(object):
+    """A write-only worksheet that buffers rows until they are flushed."""
+
+    def __init__(self, parent, worksheet):
+        self.parent = parent
+        self.worksheet = worksheet
+        self.column_dimensions = worksheet.column_dimensions
+        self.row_dimensions = worksheet.row_dimensions
+        # Maps row number to {column number: (value, style, data_type)}.
+        self._rows = {}
+        # Rows 1 through _n_flushed have been written.
+        self._n_flushed = 0
+
+    @property
+    def title(self):
+        """Worksheet title."""
+        return self.worksheet.title
+
+    @title.setter
+    def title(self, value):
+        self.worksheet.title = value
+
+    @property
+    def freeze_panes(self):
+        """Top left cell of the scrollable pane."""
+        return self.worksheet.freeze_panes
+
+    @freeze_panes.setter
+    def freeze_panes(self, value):
+        self.worksheet.freeze_panes = value
+
+    def set_cell(self, row, col, value, style=None, data_type=None):
+        """
+        Set the value, named style (default=none) and data type
+        (default=from value, e.g., "s" to force a string) of a cell.
+        """
+        if row <= self._n_flushed:
+            raise ValueError(
+                "Row {} of worksheet '{}' has already been written".format(
+                    row,
+                    self.title
+                )
+            )
+        self._rows.setdefault(row, {})[col] = (value, style, data_type)
+
+    def merge_cells(self, start_row, start_column, end_row, end_column):
+        """Merge a range of cells."""
+        self.worksheet.merged_cells.add(
+            openpyxl.worksheet.cell_range.CellRange(
+                min_col=start_column,
+                min_row=start_row,
+                max_col=end_column,
+                max_row=end_row
+            )
+        )
+
+    def add_data_validation(self, data_validation):
+        """Add a data-validation object to the worksheet."""
+        self.worksheet.data_validations.append(data_validation)
+
+    def flush(self, row=None):
+        """Write the rows before row (default=all rows) to the file."""
+        if row is None:
+            row = max(self._rows) + 1 if self._rows else 1
+        for row_idx in range(self._n_flushed + 1, row):
+            row_cells = self._rows.pop(row_idx, {})
+            values = [None] * max(row_cells.keys() + [0])
+            for col, (value, style, data_type) in row_cells.items():
+                cell = openpyxl.cell.WriteOnlyCell(self.worksheet)
+                if data_type is None:
+                    cell.value = value
+                else:
+                    cell.set_explicit_value(value, data_type)
+                if style is not None:
+                    cell.style = style
+                values[col - 1] = cell
+            self.worksheet.append(values)
+            self._n_flushed = row_idx